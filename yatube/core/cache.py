@@ -0,0 +1,32 @@
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import MemcachedCache
+
+from . import metrics
+
+FRAGMENT_PREFIX = 'template.cache.'
+MISSING = object()
+
+
+class InstrumentedCacheMixin:
+    """Считает попадания в кэш фрагментов шаблонов.
+
+    Ключ {% cache %} имеет вид template.cache.<имя>.<хеш>, имя
+    фрагмента идёт в метку метрики.
+    """
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, MISSING, version)
+        if key.startswith(FRAGMENT_PREFIX):
+            metrics.inc('yatube_fragment_cache_total', (
+                ('fragment', key.split('.')[2]),
+                ('result', 'miss' if value is MISSING else 'hit'),
+            ))
+        return default if value is MISSING else value
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    """Кэш в памяти процесса: для разработки и тестов."""
+
+
+class InstrumentedMemcachedCache(InstrumentedCacheMixin, MemcachedCache):
+    """Общий для всех воркеров кэш, см. yatube/production_settings.py."""
@@ -0,0 +1,20 @@
+import pickle
+
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .models import QueuedEmail
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """Складывает письма в очередь QueuedEmail и сразу возвращается.
+
+    Доставкой занимается команда send_queued_mail.
+    """
+
+    def send_messages(self, email_messages):
+        queued = []
+        for message in email_messages:
+            message.connection = None
+            queued.append(QueuedEmail(message=pickle.dumps(message)))
+        QueuedEmail.objects.bulk_create(queued)
+        return len(queued)
@@ -0,0 +1,158 @@
+import http.client
+import socket
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class PooledWSGIServer(WSGIServer):
+    """WSGI-сервер с ограниченным пулом потоков, как gunicorn --threads:
+    поток занят соединением, пока клиент передаёт запрос."""
+
+    def __init__(self, address, threads):
+        super().__init__(address, QuietHandler)
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_pooled, request, client_address)
+
+    def process_pooled(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+
+def serve_wsgi(port):
+    server = PooledWSGIServer(('127.0.0.1', port), settings.ASGI_THREADS)
+    server.set_app(get_wsgi_application())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+
+    return stop
+
+
+def serve_asgi(port):
+    try:
+        import uvicorn
+    except ImportError:
+        raise CommandError('Для сравнения нужен uvicorn')
+    from yatube.asgi import application
+
+    server = uvicorn.Server(uvicorn.Config(
+        application, host='127.0.0.1', port=port,
+        log_level='warning', lifespan='off',
+    ))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+        thread.join()
+
+    return stop
+
+
+def slow_client(port, path, duration):
+    """Передаёт запрос по байту за duration секунд и читает ответ."""
+    request = (
+        f'GET {path} HTTP/1.1\r\nHost: localhost\r\n'
+        'Connection: close\r\n\r\n'
+    ).encode()
+    with socket.create_connection(('127.0.0.1', port)) as sock:
+        for index in range(len(request)):
+            sock.sendall(request[index:index + 1])
+            time.sleep(duration / len(request))
+        while sock.recv(65536):
+            pass
+
+
+def fetch(port, path):
+    """Время ответа на обычный запрос в секундах."""
+    started = time.perf_counter()
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    try:
+        connection.request('GET', path)
+        connection.getresponse().read()
+    finally:
+        connection.close()
+    return time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        'Поднимает WSGI-сервер с пулом ASGI_THREADS потоков и uvicorn '
+        'с ASGI-адаптером, занимает их медленными клиентами и печатает '
+        'задержку обычных запросов на каждом.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/about/author/')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--slow', type=int, default=2 * settings.ASGI_THREADS,
+            help='Число медленных клиентов',
+        )
+        parser.add_argument(
+            '--duration', type=float, default=2.0,
+            help='За сколько секунд медленный клиент передаёт запрос',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=20,
+            help='Число обычных запросов',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        for name, serve in (('wsgi', serve_wsgi), ('asgi', serve_asgi)):
+            port = options['port']
+            stop = serve(port)
+            try:
+                fetch(port, path)
+                slow = [
+                    threading.Thread(
+                        target=slow_client,
+                        args=(port, path, options['duration']),
+                    )
+                    for _ in range(options['slow'])
+                ]
+                for thread in slow:
+                    thread.start()
+                # Медленные клиенты успевают занять соединения
+                time.sleep(0.2)
+                with ThreadPoolExecutor(options['requests']) as pool:
+                    timings = list(pool.map(
+                        fetch, [port] * options['requests'],
+                        [path] * options['requests'],
+                    ))
+                for thread in slow:
+                    thread.join()
+            finally:
+                stop()
+            self.stdout.write(
+                f'{name}: медиана {statistics.median(timings):.3f} с, '
+                f'максимум {max(timings):.3f} с'
+            )
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from core.memory import measure
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Запрашивает страницы через тестовый клиент и печатает пик '
+        'памяти и главные места выделения для каждой.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Например /?page=500')
+        parser.add_argument(
+            '--user', help='Имя пользователя, от которого делать запросы'
+        )
+        parser.add_argument(
+            '--top', type=int, default=settings.MEMORY_PROFILE_TOP
+        )
+
+    def handle(self, *args, **options):
+        client = Client()
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'Нет пользователя {options["user"]}')
+            client.force_login(user)
+        for path in options['paths']:
+            response, report = measure(
+                client.get, path, limit=options['top']
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'{path} [{response.status_code}] '
+                f'пик {report.peak / 1024:.0f} КиБ'
+            ))
+            for place, size in report.top:
+                self.stdout.write(f'  {size / 1024:>8.1f} КиБ  {place}')
@@ -0,0 +1,106 @@
+import logging
+import pickle
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import QueuedEmail
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Отправляет письма из очереди пачками через одно '
+        'переиспользуемое соединение EMAIL_DELIVERY_BACKEND.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.EMAIL_QUEUE_BATCH_SIZE,
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Не завершаться, а проверять очередь каждые --interval с',
+        )
+        parser.add_argument('--interval', type=float, default=5)
+
+    def handle(self, *args, **options):
+        connection = get_connection(settings.EMAIL_DELIVERY_BACKEND)
+        connection.open()
+        try:
+            while True:
+                sent = self.deliver(connection, options['batch_size'])
+                if sent:
+                    self.stdout.write(f'Отправлено писем: {sent}')
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        finally:
+            connection.close()
+
+    @staticmethod
+    def claim(batch_size):
+        """Забирает до batch_size писем, чья попытка уже наступила.
+
+        Условный UPDATE ставит письмам свою метку и сдвигает
+        next_attempt на EMAIL_QUEUE_LEASE: параллельный отправитель их
+        не возьмёт, а письма упавшего вернутся в очередь после аренды.
+        """
+        now = timezone.now()
+        due = QueuedEmail.objects.filter(
+            attempts__lt=settings.EMAIL_QUEUE_MAX_ATTEMPTS,
+            next_attempt__lte=now,
+        )
+        ids = list(due.values_list('id', flat=True)[:batch_size])
+        claim = uuid.uuid4()
+        due.filter(id__in=ids).update(
+            claim=claim,
+            next_attempt=now + timedelta(seconds=settings.EMAIL_QUEUE_LEASE),
+        )
+        return list(QueuedEmail.objects.filter(claim=claim))
+
+    @staticmethod
+    def retry_later(queued, error):
+        """Откладывает письмо с экспоненциальной паузой; после
+        EMAIL_QUEUE_MAX_ATTEMPTS попыток письмо остаётся в таблице
+        неотправленным."""
+        queued.attempts += 1
+        queued.last_error = str(error)
+        queued.claim = None
+        queued.next_attempt = timezone.now() + timedelta(
+            seconds=settings.EMAIL_QUEUE_RETRY_DELAY
+            * 2 ** (queued.attempts - 1)
+        )
+        queued.save(update_fields=[
+            'attempts', 'last_error', 'claim', 'next_attempt',
+        ])
+        if queued.attempts >= settings.EMAIL_QUEUE_MAX_ATTEMPTS:
+            logger.error(
+                'Письмо %s не отправлено за %s попыток: %s',
+                queued.id, queued.attempts, error,
+            )
+
+    def deliver(self, connection, batch_size):
+        sent = 0
+        for queued in self.claim(batch_size):
+            message = pickle.loads(queued.message)
+            try:
+                connection.send_messages([message])
+            except Exception as error:
+                self.retry_later(queued, error)
+            else:
+                # Удаляется сразу: падение посреди пачки не отправит
+                # уже ушедшие письма повторно
+                queued.delete()
+                sent += 1
+        return sent
@@ -0,0 +1,55 @@
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.slowlog import read_log
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводка журнала медленных запросов: отпечатки SQL по убыванию '
+        'суммарного времени, с view и последним планом выполнения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=settings.SLOW_QUERY_LOG)
+        parser.add_argument('--top', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if not options['log']:
+            raise CommandError('SLOW_QUERY_LOG не задан')
+        if not os.path.exists(options['log']):
+            raise CommandError(f'Нет журнала {options["log"]}')
+        groups = defaultdict(lambda: {
+            'count': 0, 'total': 0, 'max': 0, 'views': set(), 'plan': None,
+        })
+        for entry in read_log(options['log']):
+            group = groups[entry['fingerprint']]
+            group['count'] += 1
+            group['total'] += entry['ms']
+            group['max'] = max(group['max'], entry['ms'])
+            if entry.get('view'):
+                group['views'].add(entry['view'])
+            if entry.get('plan'):
+                group['plan'] = entry['plan']
+        ranked = sorted(
+            groups.items(), key=lambda item: item[1]['total'], reverse=True
+        )
+        for rank, (fingerprint, group) in enumerate(
+            ranked[:options['top']], 1
+        ):
+            self.stdout.write(self.style.SUCCESS(
+                f'{rank}. всего {group["total"]:.1f} мс, '
+                f'{group["count"]} раз, '
+                f'среднее {group["total"] / group["count"]:.1f} мс, '
+                f'макс. {group["max"]:.1f} мс'
+            ))
+            self.stdout.write(f'   {fingerprint}')
+            if group['views']:
+                self.stdout.write(
+                    '   view: ' + ', '.join(sorted(group['views']))
+                )
+            for line in group['plan'] or []:
+                self.stdout.write(f'   | {line}')
@@ -0,0 +1,70 @@
+import os
+import tracemalloc
+from collections import namedtuple
+from threading import Lock
+
+MemoryReport = namedtuple('MemoryReport', ['peak', 'top'])
+
+# Появился в Python 3.9
+reset_peak = getattr(tracemalloc, 'reset_peak', None)
+
+# tracemalloc один на процесс: параллельный замер сбил бы пик чужого,
+# а закончивший первым выключил бы трассировку под ногами у второго
+lock = Lock()
+
+
+def site(stat):
+    """Место выделения в виде «путь:строка», путь от корня проекта."""
+    frame = stat.traceback[0]
+    return f'{os.path.relpath(frame.filename)}:{frame.lineno}'
+
+
+def measure(func, *args, limit=10, wait=True, **kwargs):
+    """Выполняет func под tracemalloc.
+
+    Возвращает результат func и MemoryReport: пиковый прирост
+    памяти в байтах и limit мест, где выделено больше всего
+    (список пар «место, байты»). Если трассировка уже включена
+    снаружи, она не выключается. Замеры идут по одному; с
+    wait=False во время чужого замера func выполняется без него,
+    а вместо отчёта возвращается None.
+    """
+    if not lock.acquire(blocking=wait):
+        return func(*args, **kwargs), None
+    try:
+        return _measure(func, args, kwargs, limit)
+    finally:
+        lock.release()
+
+
+def _measure(func, args, kwargs, limit):
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    elif reset_peak is not None:
+        reset_peak()
+    else:
+        # До Python 3.9 пик сбрасывается только перезапуском
+        # трассировки; накопленные снаружи трассы при этом теряются
+        frames = tracemalloc.get_traceback_limit()
+        tracemalloc.stop()
+        tracemalloc.start(frames)
+    try:
+        before = tracemalloc.take_snapshot()
+        baseline = tracemalloc.get_traced_memory()[0]
+        result = func(*args, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+        after = tracemalloc.take_snapshot()
+    finally:
+        if started:
+            tracemalloc.stop()
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    stats = after.filter_traces(filters).compare_to(
+        before.filter_traces(filters), 'lineno'
+    )
+    top = [
+        (site(stat), stat.size_diff)
+        for stat in stats[:limit]
+        if stat.size_diff > 0
+    ]
+    return result, MemoryReport(max(peak, 0), top)
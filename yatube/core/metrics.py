@@ -0,0 +1,263 @@
+"""Метрики в формате Prometheus.
+
+Каждый процесс копит значения в памяти (запись — пара операций
+со словарём под блокировкой) и раз в METRICS_FLUSH_INTERVAL секунд
+сбрасывает их целиком в свой файл в METRICS_DIR. Эндпоинт /metrics
+складывает файлы всех воркеров, поэтому не важно, какой процесс
+принял запрос Prometheus.
+
+Файлы завершившихся процессов при сборе сливаются в один архив:
+счётчики и гистограммы в нём продолжают расти, а датчики мёртвых
+процессов отбрасываются. Процесс узнаётся по pid в имени файла,
+поэтому METRICS_DIR должен быть своим у каждой машины.
+"""
+
+import atexit
+import fcntl
+import json
+import os
+import time
+from bisect import bisect_left
+from threading import Lock
+
+from django.conf import settings
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Имя: (тип, описание, границы корзин гистограммы)
+METRICS = {
+    'yatube_request_seconds': (
+        'histogram', 'Время ответа по view_name', SECONDS,
+    ),
+    'yatube_request_queries': (
+        'histogram', 'SQL-запросов на запрос по view_name',
+        (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+    ),
+    'yatube_fragment_cache_total': (
+        'counter', 'Попадания и промахи кэша фрагментов шаблонов', None,
+    ),
+    'yatube_thumbnail_seconds': (
+        'histogram', 'Генерация миниатюры sorl-thumbnail', SECONDS,
+    ),
+    'yatube_image_variants_seconds': (
+        'histogram', 'Нарезка вариантов картинки поста', SECONDS,
+    ),
+    'yatube_auth_hash_in_flight': (
+        'gauge', 'Проверки паролей в пуле, включая очередь', None,
+    ),
+    'yatube_auth_hash_queued': (
+        'gauge', 'Проверки паролей в очереди пула', None,
+    ),
+    'yatube_auth_hash_rejected_total': (
+        'counter', 'Входы, отклонённые из-за переполненного пула', None,
+    ),
+    'yatube_upload_bytes': (
+        'histogram', 'Размер загруженных картинок',
+        (10 ** 4, 10 ** 5, 5 * 10 ** 5, 10 ** 6, 5 * 10 ** 6, 10 ** 7),
+    ),
+}
+
+# Сумма счётчиков и гистограмм завершившихся процессов
+ARCHIVE = 'dead.json'
+LOCK = '.lock'
+
+
+class Registry:
+    def __init__(self):
+        self.lock = Lock()
+        self.values = {}
+        self.flushed_at = time.monotonic()
+        # pid может достаться новому процессу, время старта — нет
+        self.filename = f'{os.getpid()}-{time.time_ns()}.json'
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def gauge(self, name, value, labels=()):
+        key = (name, labels)
+        with self.lock:
+            self.values[key] = value
+
+    def observe(self, name, value, labels=()):
+        """Гистограмма: счётчики корзин, затем сумма и количество."""
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(buckets) + 3)
+            counts[bisect_left(buckets, value)] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def dump(self):
+        with self.lock:
+            return [
+                [
+                    name,
+                    [list(pair) for pair in labels],
+                    list(value) if isinstance(value, list) else value,
+                ]
+                for (name, labels), value in self.values.items()
+            ]
+
+    def flush(self):
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = os.path.join(settings.METRICS_DIR, self.filename)
+        with open(path + '.tmp', 'w') as file:
+            json.dump(self.dump(), file)
+        os.replace(path + '.tmp', path)
+        self.flushed_at = time.monotonic()
+
+    def maybe_flush(self):
+        interval = settings.METRICS_FLUSH_INTERVAL
+        if time.monotonic() - self.flushed_at > interval:
+            self.flush()
+
+
+registry = Registry()
+
+
+@atexit.register
+def flush_at_exit():
+    # Команды manage.py без запросов не оставляют пустых файлов
+    if registry.values:
+        registry.flush()
+
+
+def inc(name, labels=(), value=1):
+    registry.inc(name, labels, value)
+
+
+def gauge(name, value, labels=()):
+    registry.gauge(name, value, labels)
+
+
+def observe(name, value, labels=()):
+    registry.observe(name, value, labels)
+
+
+def process_alive(filename):
+    try:
+        os.kill(int(filename.split('-', 1)[0]), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        # Чужой процесс жив; файл без pid не трогаем
+        return True
+    return True
+
+
+def read_dump(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def read_dumps():
+    """Значения всех процессов: свои из памяти, чужие из файлов.
+
+    Файлы завершившихся процессов переносятся в архив под блокировкой
+    каталога, чтобы два одновременных сбора не учли их дважды.
+    """
+    dumps = [registry.dump()]
+    directory = settings.METRICS_DIR
+    if not os.path.isdir(directory):
+        return dumps
+    with open(os.path.join(directory, LOCK), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive = read_dump(os.path.join(directory, ARCHIVE)) or []
+        dead = []
+        for filename in os.listdir(directory):
+            if filename in (registry.filename, ARCHIVE) or (
+                not filename.endswith('.json')
+            ):
+                continue
+            path = os.path.join(directory, filename)
+            dump = read_dump(path)
+            if dump is None:
+                continue
+            if process_alive(filename):
+                dumps.append(dump)
+            else:
+                dead.append((path, dump))
+        if dead:
+            archive = to_dump(merge(
+                [archive] + [dump for _, dump in dead],
+                kinds=('counter', 'histogram'),
+            ))
+            path = os.path.join(directory, ARCHIVE)
+            with open(path + '.tmp', 'w') as file:
+                json.dump(archive, file)
+            os.replace(path + '.tmp', path)
+            for path, _ in dead:
+                os.remove(path)
+    dumps.append(archive)
+    return dumps
+
+
+def merge(dumps, kinds=('counter', 'gauge', 'histogram')):
+    """Складывает значения метрик перечисленных типов."""
+    merged = {}
+    for dump in dumps:
+        for name, labels, value in dump:
+            if name not in METRICS or METRICS[name][0] not in kinds:
+                continue
+            key = (name, tuple(tuple(pair) for pair in labels))
+            if key not in merged:
+                merged[key] = value
+            elif isinstance(value, list):
+                merged[key] = [a + b for a, b in zip(merged[key], value)]
+            else:
+                merged[key] += value
+    return merged
+
+
+def to_dump(merged):
+    return [
+        [name, [list(pair) for pair in labels], value]
+        for (name, labels), value in merged.items()
+    ]
+
+
+def collect():
+    """Суммирует счётчики, датчики и корзины гистограмм всех
+    процессов."""
+    return merge(read_dumps())
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, str(value).replace('"', '\\"'))
+        for name, value in labels
+    ) + '}'
+
+
+def render():
+    """Текстовый формат экспозиции Prometheus."""
+    merged = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for (metric, labels), value in sorted(merged.items()):
+            if metric != name:
+                continue
+            if kind in ('counter', 'gauge'):
+                lines.append(f'{name}{format_labels(labels)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), value):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(
+                    name, format_labels(labels + (('le', bound),)), cumulative
+                ))
+            lines.append(f'{name}_sum{format_labels(labels)} {value[-2]}')
+            lines.append(f'{name}_count{format_labels(labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
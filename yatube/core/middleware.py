@@ -0,0 +1,121 @@
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from . import metrics
+from .memory import measure
+from .sampling import profiler
+from .slowlog import SlowQueryLog
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsMiddleware:
+    """Время ответа и число SQL-запросов по view_name."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        match = request.resolver_match
+        labels = (('view', match.view_name if match else 'unresolved'),)
+        metrics.observe('yatube_request_seconds', elapsed, labels)
+        metrics.observe('yatube_request_queries', queries[0], labels)
+        metrics.registry.maybe_flush()
+        return response
+
+
+class SlowQueryLogMiddleware:
+    """Пишет запросы дольше SLOW_QUERY_THRESHOLD_MS в SLOW_QUERY_LOG.
+
+    Без SLOW_QUERY_LOG выключено.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_LOG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with connection.execute_wrapper(SlowQueryLog(request)):
+            return self.get_response(request)
+
+
+class MemoryProfileMiddleware:
+    """Пик памяти и главные места выделения для каждого запроса.
+
+    Включается настройкой MEMORY_PROFILE: tracemalloc заметно
+    замедляет работу, поэтому на бою middleware выключено.
+    Отчёт пишется в лог, пик — ещё и в заголовок X-Memory-Peak.
+    Запрос, пришедший во время замера другого, не профилируется.
+    """
+
+    def __init__(self, get_response):
+        if not settings.MEMORY_PROFILE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response, report = measure(
+            self.get_response, request,
+            limit=settings.MEMORY_PROFILE_TOP, wait=False,
+        )
+        if report is None:
+            return response
+        match = request.resolver_match
+        view_name = match.view_name if match else request.path
+        response['X-Memory-Peak'] = str(report.peak)
+        logger.info(
+            'memory %s peak=%d top=%s',
+            view_name,
+            report.peak,
+            ', '.join(f'{place} {size}' for place, size in report.top),
+        )
+        return response
+
+
+class SamplingProfilerMiddleware:
+    """Отдаёт семплирующему профайлеру часть запросов.
+
+    Включается настройкой SAMPLING_PROFILER. Профилируется доля
+    SAMPLING_PROFILER_RATE запросов, а во время окна, открытого
+    через core.views.profiler_stacks, — все запросы.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SAMPLING_PROFILER:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            profiler.detach()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(view_func, 'profiler_exempt', False):
+            return None
+        if (
+            profiler.in_window()
+            or random.random() < settings.SAMPLING_PROFILER_RATE
+        ):
+            profiler.attach(
+                request.resolver_match.view_name,
+                root=SamplingProfilerMiddleware.__call__.__code__,
+            )
+        return None
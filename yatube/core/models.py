@@ -1,12 +1,34 @@
 from django.db import models
+from django.utils import timezone
 
 
 class CreatedModel(models.Model):
     """Абстрактная модель. Добавляет дату создания."""
     created = models.DateTimeField(
         'Дата создания',
-        auto_now_add=True
+        auto_now_add=True,
+        db_index=True,
     )
 
     class Meta:
         abstract = True
+
+
+class QueuedEmail(CreatedModel):
+    """Письмо, ожидающее отправки командой send_queued_mail."""
+    message = models.BinaryField('Письмо')
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    next_attempt = models.DateTimeField(
+        'Следующая попытка',
+        default=timezone.now,
+        db_index=True,
+    )
+    # Метка отправителя, который взял письмо; next_attempt у взятого
+    # письма — конец аренды, после него письмо снова в очереди
+    claim = models.UUIDField(null=True, editable=False)
+
+    class Meta:
+        ordering = ['created']
+        verbose_name = 'Письмо в очереди'
+        verbose_name_plural = 'Письма в очереди'
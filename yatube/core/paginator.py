@@ -0,0 +1,47 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator без точного COUNT(*) на каждый запрос.
+
+    Для нефильтрованной таблицы в PostgreSQL берётся оценка из
+    pg_class.reltuples, в остальных случаях точный count кэшируется
+    на ESTIMATED_COUNT_TIMEOUT секунд.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+        estimate = self.estimate(queryset)
+        if estimate is not None:
+            return estimate
+        key = 'paginator:count:' + md5(
+            str(queryset.query).encode()
+        ).hexdigest()
+        return cache.get_or_set(
+            key, queryset.count, settings.ESTIMATED_COUNT_TIMEOUT
+        )
+
+    @staticmethod
+    def estimate(queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql' or queryset.query.where:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] <= 0:
+            return None
+        return int(row[0])
@@ -0,0 +1,95 @@
+import json
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# Литералы и списки параметров заменяются на «?», чтобы запросы,
+# отличающиеся только значениями, давали один отпечаток
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN \((?:\?(?:, )?)+\)')
+SPACES_RE = re.compile(r'\s+')
+SAVEPOINT_RE = re.compile(r'^(?:RELEASE )?SAVEPOINT\b|^ROLLBACK TO SAVEPOINT')
+
+
+def normalize_sql(sql):
+    """Отпечаток запроса: SQL без конкретных значений."""
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = SPACES_RE.sub(' ', sql).strip()
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+class QueryRecorder(CaptureQueriesContext):
+    """Записывает запросы блока и группирует их по отпечаткам.
+
+    Служебные SAVEPOINT не учитываются.
+    """
+
+    def __init__(self, using=connection):
+        super().__init__(using)
+
+    @property
+    def fingerprints(self):
+        return [
+            normalize_sql(query['sql'])
+            for query in self.captured_queries
+            if not SAVEPOINT_RE.match(query['sql'])
+        ]
+
+    @property
+    def count(self):
+        return len(self.fingerprints)
+
+    def duplicates(self):
+        """Отпечатки, встретившиеся больше одного раза."""
+        return {
+            fingerprint: times
+            for fingerprint, times in Counter(self.fingerprints).items()
+            if times > 1
+        }
+
+
+def load_budget(path=None):
+    with open(path or settings.QUERY_BUDGET_FILE, encoding='utf-8') as file:
+        return json.load(file)
+
+
+class QueryBudgetMixin:
+    """Проверки бюджета запросов для TestCase."""
+
+    query_budget_file = None
+
+    @classmethod
+    def query_budget(cls):
+        if not hasattr(cls, '_query_budget'):
+            cls._query_budget = load_budget(cls.query_budget_file)
+        return cls._query_budget
+
+    def assertQueryBudget(self, name, func, *args, **kwargs):
+        """Выполняет func и сверяет её запросы с бюджетом name.
+
+        Падает, если запросов больше бюджета или какой-то
+        отпечаток повторяется (типичный признак N+1).
+        """
+        budget = self.query_budget()
+        if name not in budget:
+            self.fail(f'Для {name} нет бюджета в {settings.QUERY_BUDGET_FILE}')
+        with QueryRecorder() as recorder:
+            result = func(*args, **kwargs)
+        queries = '\n'.join(recorder.fingerprints)
+        self.assertLessEqual(
+            recorder.count,
+            budget[name],
+            f'{name}: {recorder.count} запросов при бюджете '
+            f'{budget[name]}:\n{queries}',
+        )
+        self.assertEqual(
+            recorder.duplicates(),
+            {},
+            f'{name}: повторяющиеся запросы:\n{queries}',
+        )
+        return result
@@ -0,0 +1,184 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+WINDOW_FILE = 'window'
+# Как часто воркер перечитывает срок окна и сколько после срока
+# эндпоинт ждёт файлов воркеров, секунды
+WINDOW_POLL = 1
+
+
+def frame_name(frame):
+    module = frame.f_globals.get('__name__', '?')
+    return f'{module}.{frame.f_code.co_name}'
+
+
+class SamplingProfiler:
+    """Семплирующий профайлер запросов.
+
+    Фоновый поток раз в SAMPLING_PROFILER_INTERVAL секунд снимает
+    стеки только тех потоков, которые сейчас обрабатывают выбранные
+    для профилирования запросы, и считает одинаковые стеки. Сами
+    запросы ничего не делают, кроме регистрации потока, поэтому
+    накладные расходы ограничены частотой семплирования.
+
+    Срок окна, когда профилируются все запросы, лежит в файле в
+    SAMPLING_PROFILER_DIR и виден всем воркерам. Стеки, снятые за
+    окно, каждый воркер по его окончании пишет в свой файл там же.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.active = {}
+        self.stacks = Counter()
+        self.until = 0
+        self.checked_at = 0
+        # Срок окна, за которое копятся window_stacks
+        self.window = None
+        self.window_stacks = Counter()
+        self.thread = None
+
+    def attach(self, view_name, root=None):
+        """Начать семплировать текущий поток под именем view_name.
+
+        root — код функции, выше которого стек не нужен (например
+        middleware), чтобы в нём не было кадров сервера.
+        """
+        self.ensure_running()
+        with self.lock:
+            self.active[threading.get_ident()] = (view_name, root)
+
+    def detach(self):
+        with self.lock:
+            self.active.pop(threading.get_ident(), None)
+
+    def start_window(self, seconds):
+        """Профилировать во всех воркерах все запросы ближайшие
+        seconds секунд; файлы прошлого окна удаляются."""
+        directory = settings.SAMPLING_PROFILER_DIR
+        os.makedirs(directory, exist_ok=True)
+        for filename in os.listdir(directory):
+            if filename.endswith('.txt'):
+                os.remove(os.path.join(directory, filename))
+        path = os.path.join(directory, WINDOW_FILE)
+        with open(path + '.tmp', 'w') as file:
+            file.write(repr(time.time() + seconds))
+        os.replace(path + '.tmp', path)
+        self.checked_at = 0
+
+    def in_window(self):
+        now = time.time()
+        if now - self.checked_at >= WINDOW_POLL:
+            self.checked_at = now
+            self.until = read_deadline()
+        if now >= self.until:
+            return False
+        with self.lock:
+            if self.window != self.until:
+                self.window = self.until
+                self.window_stacks = Counter()
+        return True
+
+    def maybe_dump(self):
+        """По окончании окна пишет его стеки в файл воркера."""
+        with self.lock:
+            window = self.window
+            if window is None or time.time() < window:
+                return
+            stacks = self.window_stacks
+            self.window = None
+            self.window_stacks = Counter()
+        directory = settings.SAMPLING_PROFILER_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(
+            directory, f'{window!r}-{os.getpid()}-{id(self)}.txt'
+        )
+        with open(path + '.tmp', 'w') as file:
+            file.write(format_collapsed(stacks))
+        os.replace(path + '.tmp', path)
+
+    def ensure_running(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name='sampling-profiler', daemon=True
+                )
+                self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.maybe_dump()
+            with self.lock:
+                active = dict(self.active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            samples = []
+            for ident, (view_name, root) in active.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    samples.append(self.collapse(view_name, root, frame))
+            with self.lock:
+                self.stacks.update(samples)
+                if self.window is not None:
+                    self.window_stacks.update(samples)
+
+    @staticmethod
+    def collapse(view_name, root, frame):
+        names = []
+        while frame is not None and frame.f_code is not root:
+            names.append(frame_name(frame))
+            frame = frame.f_back
+        names.append(view_name)
+        return ';'.join(reversed(names))
+
+    def snapshot(self, reset=False):
+        """Копия счётчиков стеков; reset обнуляет накопленное."""
+        with self.lock:
+            stacks = Counter(self.stacks)
+            if reset:
+                self.stacks.clear()
+        return stacks
+
+
+def read_deadline():
+    """Срок последнего окна (time.time()) или 0, если окна не было."""
+    path = os.path.join(settings.SAMPLING_PROFILER_DIR, WINDOW_FILE)
+    try:
+        with open(path) as file:
+            return float(file.read())
+    except (OSError, ValueError):
+        return 0
+
+
+def window_stacks(deadline):
+    """Стеки окна со сроком deadline, сложенные по всем воркерам."""
+    directory = settings.SAMPLING_PROFILER_DIR
+    prefix = f'{deadline!r}-'
+    stacks = Counter()
+    for filename in os.listdir(directory):
+        if not (filename.startswith(prefix) and filename.endswith('.txt')):
+            continue
+        with open(os.path.join(directory, filename)) as file:
+            for line in file:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                stacks[stack] += int(count)
+    return stacks
+
+
+def format_collapsed(stacks):
+    """Стеки в формате flamegraph.pl: «view;f1;f2 число»."""
+    return ''.join(
+        f'{stack} {count}\n' for stack, count in sorted(stacks.items())
+    )
+
+
+profiler = SamplingProfiler(settings.SAMPLING_PROFILER_INTERVAL)
@@ -0,0 +1,88 @@
+import json
+import os
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .queries import normalize_sql
+
+EXPLAIN = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+}
+
+
+class SlowQueryLog:
+    """Обёртка execute, пишущая медленные запросы в SLOW_QUERY_LOG.
+
+    Каждая запись — строка JSON: время, длительность, view_name
+    запроса, отпечаток и текст SQL и план выполнения. План
+    снимается только для SELECT, повторным запуском с EXPLAIN.
+    """
+
+    def __init__(self, request=None):
+        self.request = request
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.explaining:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            if elapsed >= settings.SLOW_QUERY_THRESHOLD_MS:
+                self.write(sql, params, many, context, elapsed)
+
+    def view_name(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return match.view_name if match else None
+
+    def explain(self, connection, sql, params):
+        prefix = EXPLAIN.get(connection.vendor)
+        if prefix is None or not sql.lstrip().upper().startswith('SELECT'):
+            return None
+        self.explaining = True
+        try:
+            # Отдельная точка сохранения: ошибка EXPLAIN в PostgreSQL
+            # иначе оборвала бы транзакцию самого запроса
+            with transaction.atomic(using=connection.alias):
+                with connection.cursor() as cursor:
+                    cursor.execute(prefix + sql, params)
+                    return [
+                        ' '.join(str(column) for column in row)
+                        for row in cursor.fetchall()
+                    ]
+        except DatabaseError as error:
+            return [f'EXPLAIN failed: {error}']
+        finally:
+            self.explaining = False
+
+    def write(self, sql, params, many, context, elapsed):
+        connection = context['connection']
+        entry = {
+            'time': timezone.now().isoformat(),
+            'ms': round(elapsed, 3),
+            'view': self.view_name(),
+            'fingerprint': normalize_sql(sql),
+            'sql': sql,
+            'plan': None if many else self.explain(connection, sql, params),
+        }
+        directory = os.path.dirname(settings.SLOW_QUERY_LOG)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(settings.SLOW_QUERY_LOG, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def read_log(path):
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
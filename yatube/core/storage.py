@@ -0,0 +1,130 @@
+import hashlib
+import os
+import re
+import tempfile
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, Storage
+from django.utils.encoding import filepath_to_uri
+
+# posts/ab/ab12...ef.jpg: каталог, два первых символа хеша, sha256
+CONTENT_ADDRESSED = re.compile(r'(^|/)([0-9a-f]{2})/\2[0-9a-f]{62}\.\w+$')
+
+
+def is_content_addressed(name):
+    """Имя из ContentAddressedStorage: содержимое по нему не меняется."""
+    return CONTENT_ADDRESSED.search(name) is not None
+
+
+def upload_name(name):
+    """Имя до раскладки по хешу: posts/ab/ab…ef.jpg → posts/ab…ef.jpg.
+
+    Новое содержимое, сохранённое под ним, ляжет рядом с прежним
+    (posts/cd/cd…01.jpg), а не вложится в каталог хеша.
+    """
+    if not is_content_addressed(name):
+        return name
+    directory, basename = os.path.split(name)
+    return os.path.join(os.path.dirname(directory), basename)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, кладущее файл под sha256 его содержимого.
+
+    Хеш считается при потоковой записи во временный файл рядом с
+    итоговым; одинаковые загрузки ложатся в один файл, и у них общие
+    миниатюры. Файл может принадлежать нескольким постам, поэтому
+    delete ничего не удаляет.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя определит хеш содержимого в _save
+        return name
+
+    def _save(self, name, content):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+        digest = hashlib.sha256()
+        handle, temporary = tempfile.mkstemp(
+            dir=self.path(directory), suffix='.upload'
+        )
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    file.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = '/'.join(
+                part for part in (directory, hexdigest[:2]) if part
+            ) + f'/{hexdigest}{extension}'
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(temporary)
+                # Свежее время изменения бережёт файл от уборки
+                # collect_media_garbage, пока новый пост не сохранён
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.chmod(temporary, self.file_permissions_mode or 0o644)
+                os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
+
+    def delete(self, name):
+        pass
+
+
+class InMemoryStorage(Storage):
+    """Файловое хранилище в памяти процесса, для тестов.
+
+    Содержимое общее для всех экземпляров, чтобы default_storage и
+    хранилище sorl-thumbnail видели одни и те же файлы.
+    """
+    files = {}
+
+    def _open(self, name, mode='rb'):
+        return ContentFile(self.files[name], name=name)
+
+    def _save(self, name, content):
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        self.files[name] = b''.join(
+            chunk if isinstance(chunk, bytes) else chunk.encode()
+            for chunk in content.chunks()
+        )
+        return name
+
+    def delete(self, name):
+        self.files.pop(name, None)
+
+    def exists(self, name):
+        return name in self.files
+
+    def size(self, name):
+        return len(self.files[name])
+
+    def url(self, name):
+        return urljoin(settings.MEDIA_URL, filepath_to_uri(name))
+
+    def listdir(self, path):
+        prefix = path.rstrip('/') + '/' if path else ''
+        directories, files = set(), []
+        for name in self.files:
+            if not name.startswith(prefix):
+                continue
+            head, _, tail = name[len(prefix):].partition('/')
+            if tail:
+                directories.add(head)
+            else:
+                files.append(head)
+        return sorted(directories), sorted(files)
@@ -0,0 +1,15 @@
+from django import template
+
+register = template.Library()
+
+# Сколько соседних страниц показывать слева и справа от текущей
+PAGE_WINDOW = 3
+
+
+@register.filter
+def page_window(page_obj, radius=PAGE_WINDOW):
+    """Номера страниц вокруг текущей вместо полного page_range,
+    который на глубокой ленте разворачивается в сотни ссылок."""
+    first = max(page_obj.number - radius, 1)
+    last = min(page_obj.number + radius, page_obj.paginator.num_pages)
+    return range(first, last + 1)
@@ -1,6 +1,54 @@
+import asyncio
+import json
+import os
+import smtplib
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import timedelta
 from http import HTTPStatus
+from io import BytesIO, StringIO
+from unittest import mock
 
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMessage
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import URLPattern, get_resolver, reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from PIL import Image
+from posts.models import Comment, Follow, Group, Post
+from posts.stats import refresh_group_stats
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.engines.pil_engine import Engine
+
+from yatube import asgi
+from yatube.asgi import application
+
+from .models import QueuedEmail
+from . import memory, metrics
+from .middleware import MemoryProfileMiddleware
+from .queries import QueryBudgetMixin
+from .sampling import SamplingProfiler, profiler
+from .storage import (ContentAddressedStorage, is_content_addressed,
+                      upload_name)
+from .views import serve_media
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -8,3 +56,555 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class ASGITestClass(SimpleTestCase):
+    @staticmethod
+    async def call(path, body_delay=0, finished=None, method='GET',
+                   body=(b'',), headers=()):
+        scope = {
+            'type': 'http',
+            'method': method,
+            'path': path,
+            'query_string': b'',
+            'headers': [(b'host', b'testserver'), *headers],
+        }
+        messages = []
+        chunks = list(body)
+
+        async def receive():
+            await asyncio.sleep(body_delay)
+            return {
+                'type': 'http.request',
+                'body': chunks.pop(0),
+                'more_body': bool(chunks),
+            }
+
+        async def send(message):
+            messages.append(message)
+
+        await application(scope, receive, send)
+        if finished is not None:
+            finished.append(path)
+        return messages
+
+    def test_asgi_serves_pages(self):
+        messages = asyncio.run(self.call('/about/author/'))
+        self.assertEqual(messages[0]['status'], HTTPStatus.OK)
+        self.assertIn('Об авторе'.encode(), messages[1]['body'])
+
+    def test_cookie_headers_have_no_leading_space(self):
+        messages = asyncio.run(self.call(reverse('users:login')))
+        cookies = [
+            value for name, value in messages[0]['headers']
+            if name == b'set-cookie'
+        ]
+        self.assertTrue(cookies)
+        for value in cookies:
+            self.assertEqual(value, value.strip())
+
+    def test_slow_client_does_not_block_others(self):
+        """Медленный клиент не задерживает остальные запросы."""
+        finished = []
+
+        async def run():
+            await asyncio.gather(
+                self.call('/about/tech/', body_delay=0.5, finished=finished),
+                self.call('/about/author/', finished=finished),
+            )
+
+        asyncio.run(run())
+        self.assertEqual(finished, ['/about/author/', '/about/tech/'])
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=8)
+    def test_large_body_is_spooled_to_disk(self):
+        chunks = [b'a' * 6, b'b' * 6]
+
+        async def receive():
+            return {
+                'type': 'http.request',
+                'body': chunks.pop(0),
+                'more_body': bool(chunks),
+            }
+
+        body = asyncio.run(asgi.read_body({}, receive))
+        self.addCleanup(body.close)
+        self.assertTrue(body._rolled)
+        self.assertEqual(body.read(), b'a' * 6 + b'b' * 6)
+
+    @override_settings(ASGI_MAX_BODY_SIZE=10)
+    def test_too_large_body_is_rejected(self):
+        messages = asyncio.run(self.call(
+            '/about/author/', method='POST', body=[b'a' * 6, b'b' * 6]
+        ))
+        self.assertEqual(
+            messages[0]['status'], HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+        )
+
+    @override_settings(ASGI_MAX_BODY_SIZE=10)
+    def test_too_large_content_length_is_rejected_before_reading(self):
+        messages = asyncio.run(self.call(
+            '/about/author/', method='POST', body=[],
+            headers=[(b'content-length', b'11')],
+        ))
+        self.assertEqual(
+            messages[0]['status'], HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+        )
+
+    def test_streaming_response_is_sent_in_chunks(self):
+        def wsgi_application(environ, start_response):
+            response = StreamingHttpResponse(iter([b'first', b'second']))
+            start_response('200 OK', list(response.items()))
+            return response
+
+        with mock.patch.object(asgi, 'wsgi_application', wsgi_application):
+            messages = asyncio.run(self.call('/stream/'))
+        self.assertEqual(
+            [(message.get('body'), message.get('more_body', False))
+             for message in messages[1:]],
+            [(b'first', True), (b'second', True), (b'', False)],
+        )
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise smtplib.SMTPException('Сервер недоступен')
+
+
+@override_settings(
+    EMAIL_BACKEND='core.mail.QueuedEmailBackend',
+    EMAIL_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class QueuedEmailTest(TestCase):
+    def queue(self, count):
+        for i in range(count):
+            EmailMessage('Тема', 'Текст', to=[f'user{i}@test.ru']).send()
+
+    def deliver(self):
+        call_command('send_queued_mail', stdout=StringIO())
+
+    def test_password_reset_mail_is_queued_then_delivered(self):
+        User.objects.create_user(
+            username='testuser', email='test@test.ru', password='pass-12345'
+        )
+        self.client.post(
+            reverse('users:password_reset_form'), {'email': 'test@test.ru'}
+        )
+        self.assertEqual(QueuedEmail.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 0)
+        call_command('send_queued_mail', stdout=StringIO())
+        self.assertEqual(QueuedEmail.objects.count(), 0)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['test@test.ru'])
+
+    @override_settings(EMAIL_DELIVERY_BACKEND='core.tests.FailingEmailBackend')
+    def test_failed_mail_waits_before_retry(self):
+        self.queue(1)
+        self.deliver()
+        queued = QueuedEmail.objects.get()
+        self.assertEqual(queued.attempts, 1)
+        self.assertIsNone(queued.claim)
+        self.assertGreater(queued.next_attempt, timezone.now())
+        self.deliver()
+        self.assertEqual(QueuedEmail.objects.get().attempts, 1)
+
+    def test_claimed_mail_waits_for_lease(self):
+        """Письмо, взятое другим отправителем, не отправляется второй
+        раз, пока не кончится его аренда."""
+        self.queue(2)
+        claimed = QueuedEmail.objects.first()
+        QueuedEmail.objects.filter(pk=claimed.pk).update(
+            claim=uuid.uuid4(), next_attempt=timezone.now() + timedelta(
+                hours=1
+            ),
+        )
+        self.deliver()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(list(QueuedEmail.objects.all()), [claimed])
+        QueuedEmail.objects.update(next_attempt=timezone.now())
+        self.deliver()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(QueuedEmail.objects.exists())
+
+    @override_settings(
+        EMAIL_DELIVERY_BACKEND='core.tests.FailingEmailBackend',
+        EMAIL_QUEUE_MAX_ATTEMPTS=1,
+    )
+    def test_undeliverable_mail_is_logged(self):
+        self.queue(1)
+        with self.assertLogs(
+            'core.management.commands.send_queued_mail', 'ERROR'
+        ) as logs:
+            self.deliver()
+        self.assertIn('Сервер недоступен', logs.output[0])
+        QueuedEmail.objects.update(next_attempt=timezone.now())
+        self.deliver()
+        self.assertEqual(QueuedEmail.objects.get().attempts, 1)
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Каждая страница posts, users и about укладывается в бюджет
+    запросов из QUERY_BUDGET_FILE и не повторяет запросы."""
+
+    namespaces = ('posts', 'users', 'about')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@test.ru', password='pass-12345'
+        )
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(3)
+        ]
+        cls.group = Group.objects.create(
+            title='Группа', slug='test-slug', description='Описание'
+        )
+        Post.objects.bulk_create(
+            Post(
+                text=f'Пост {i}',
+                author=cls.authors[i % 3],
+                group=cls.group if i % 2 else None,
+            )
+            for i in range(15)
+        )
+        refresh_group_stats([cls.group.id])
+        cls.post = Post.objects.filter(author=cls.authors[0]).first()
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=author, text='Комментарий')
+            for author in cls.authors
+        )
+        Follow.objects.bulk_create(
+            Follow(user=cls.user, author=author) for author in cls.authors
+        )
+
+    def url_kwargs(self):
+        return {
+            'slug': self.group.slug,
+            'username': self.authors[0].username,
+            'post_id': self.post.id,
+            # Ссылку сброса открывает не тот, кто сейчас вошёл
+            'uidb64': urlsafe_base64_encode(force_bytes(self.authors[1].pk)),
+            'token': default_token_generator.make_token(self.authors[1]),
+        }
+
+    def named_patterns(self):
+        resolver = get_resolver()
+        for namespace in self.namespaces:
+            _, urlconf = resolver.namespace_dict[namespace]
+            for pattern in urlconf.url_patterns:
+                if isinstance(pattern, URLPattern):
+                    yield f'{namespace}:{pattern.name}', pattern
+
+    def test_pages_fit_query_budget(self):
+        kwargs = self.url_kwargs()
+        for name, pattern in self.named_patterns():
+            with self.subTest(name=name):
+                url = reverse(name, kwargs={
+                    key: kwargs[key] for key in pattern.pattern.converters
+                })
+                if name == 'posts:new_posts':
+                    url += '?since=0&feed=follow'
+                cache.clear()
+                self.client.force_login(self.user)
+                self.assertQueryBudget(name, self.client.get, url)
+
+
+class MemoryProfileMiddlewareTest(TestCase):
+    @override_settings(MEMORY_PROFILE=True)
+    def test_reports_peak_when_enabled(self):
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            response = Client().get(reverse('about:author'))
+        self.assertGreater(int(response['X-Memory-Peak']), 0)
+        self.assertIn('memory about:author peak=', logs.output[0])
+
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('about:author'))
+        self.assertFalse(response.has_header('X-Memory-Peak'))
+
+    @override_settings(MEMORY_PROFILE=True)
+    def test_overlapping_request_is_not_profiled(self):
+        """Замер, начавший трассировку, заканчивается раньше запроса,
+        пришедшего во время него: трассировка не пропадает у второго."""
+        entered, release = threading.Event(), threading.Event()
+        reports = []
+
+        def first_request():
+            entered.set()
+            release.wait()
+
+        first = threading.Thread(
+            target=lambda: reports.append(memory.measure(first_request)[1])
+        )
+        first.start()
+        entered.wait()
+
+        def get_response(request):
+            release.set()
+            first.join()
+            return HttpResponse()
+
+        response = MemoryProfileMiddleware(get_response)(
+            RequestFactory().get('/')
+        )
+        self.assertFalse(response.has_header('X-Memory-Peak'))
+        self.assertIsNotNone(reports[0])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_peak_is_reset_without_reset_peak(self):
+        """До Python 3.9 прежний пик сбрасывается перезапуском
+        трассировки."""
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        bytearray(8 * 1024 * 1024)
+        with mock.patch.object(memory, 'reset_peak', None):
+            _, report = memory.measure(bytearray, 1024 * 1024)
+        self.assertGreaterEqual(report.peak, 1024 * 1024)
+        self.assertLess(report.peak, 4 * 1024 * 1024)
+        self.assertTrue(tracemalloc.is_tracing())
+
+
+def busy_loop(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+class SamplingProfilerTest(TestCase):
+    def test_collects_stacks_of_attached_thread(self):
+        sampler = SamplingProfiler(interval=0.001)
+        sampler.attach('test:busy')
+        busy_loop(0.2)
+        sampler.detach()
+        stacks = sampler.snapshot()
+        self.assertTrue(stacks)
+        for stack in stacks:
+            self.assertTrue(stack.startswith('test:busy;'))
+        self.assertTrue(any(
+            stack.endswith('core.tests.busy_loop') for stack in stacks
+        ))
+
+    @override_settings(SAMPLING_PROFILER=True, SAMPLING_PROFILER_RATE=1.0)
+    def test_middleware_attaches_by_view_name(self):
+        with mock.patch.object(profiler, 'attach') as attach:
+            Client().get(reverse('about:author'))
+        attach.assert_called_once_with('about:author', root=mock.ANY)
+
+    @override_settings(SAMPLING_PROFILER=True)
+    def test_endpoint_is_staff_only(self):
+        url = reverse('profiler')
+        user = User.objects.create_user(username='user')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.FOUND)
+        user.is_staff = True
+        user.save()
+        self.client.force_login(user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            response['Content-Type'], 'text/plain; charset=utf-8'
+        )
+
+
+@override_settings(SAMPLING_PROFILER=True)
+class ProfilerWindowTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        dir_setting = override_settings(SAMPLING_PROFILER_DIR=directory.name)
+        dir_setting.enable()
+        self.addCleanup(dir_setting.disable)
+        self.client.force_login(
+            User.objects.create_user(username='admin', is_staff=True)
+        )
+        self.url = reverse('profiler')
+
+    def test_window_is_opened_without_waiting(self):
+        self.assertEqual(
+            self.client.get(self.url, {'window': ''}).status_code,
+            HTTPStatus.NOT_FOUND,
+        )
+        started = time.monotonic()
+        response = self.client.get(self.url, {'seconds': 30})
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(response.status_code, HTTPStatus.ACCEPTED)
+        self.assertTrue(SamplingProfiler(interval=1).in_window())
+        response = self.client.get(self.url, {'window': ''})
+        self.assertEqual(response.status_code, HTTPStatus.ACCEPTED)
+        self.assertGreaterEqual(int(response['Retry-After']), 30)
+
+    def test_window_stacks_of_all_workers_are_merged(self):
+        """Каждый профайлер — как отдельный воркер со своим файлом."""
+        workers = [SamplingProfiler(interval=0.001) for _ in range(2)]
+        self.client.get(self.url, {'seconds': 0})
+        deadline = time.time() + 0.5
+        with mock.patch('core.sampling.read_deadline', return_value=deadline):
+            for worker in workers:
+                self.assertTrue(worker.in_window())
+                worker.attach('test:busy')
+                busy_loop(0.1)
+                worker.detach()
+        busy_loop(deadline - time.time() + 0.1)
+        with mock.patch('core.views.read_deadline', return_value=deadline):
+            with mock.patch('core.views.WINDOW_POLL', 0):
+                response = self.client.get(self.url, {'window': ''})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        merged = sum(
+            int(line.rpartition(' ')[2])
+            for line in response.content.decode().splitlines()
+        )
+        self.assertEqual(merged, sum(
+            sum(worker.stacks.values()) for worker in workers
+        ))
+        dumps = [
+            name for name in os.listdir(self.directory)
+            if name.endswith('.txt')
+        ]
+        self.assertEqual(len(dumps), len(workers))
+
+
+class MetricsTest(TestCase):
+    def test_request_latency_and_fragment_cache(self):
+        cache.clear()
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        body = response.content.decode()
+        self.assertIn(
+            'yatube_request_seconds_bucket{view="posts:index",le="+Inf"}',
+            body,
+        )
+        self.assertIn('yatube_request_queries_count{view="posts:index"}', body)
+        for result in ('hit', 'miss'):
+            self.assertIn(
+                'yatube_fragment_cache_total'
+                f'{{fragment="index_page",result="{result}"}}',
+                body,
+            )
+
+    def test_values_of_other_workers_are_summed(self):
+        labels = (('fragment', 'workers'), ('result', 'hit'))
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, '1-1.json'), 'w') as file:
+                json.dump([
+                    ['yatube_fragment_cache_total', labels, 5],
+                    ['yatube_upload_bytes', [], [1, 0, 0, 0, 0, 0, 0, 10, 1]],
+                ], file)
+            with override_settings(METRICS_DIR=directory):
+                metrics.inc('yatube_fragment_cache_total', labels, 2)
+                # Свой файл не складывается с памятью процесса повторно
+                metrics.registry.flush()
+                merged = metrics.collect()
+        self.assertEqual(merged['yatube_fragment_cache_total', labels], 7)
+        self.assertEqual(
+            merged['yatube_upload_bytes', ()], [1, 0, 0, 0, 0, 0, 0, 10, 1]
+        )
+
+    def test_files_of_dead_workers_are_archived(self):
+        """Счётчики завершившегося процесса переезжают в архив и не
+        теряются, а его датчики больше не учитываются."""
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        counter = (('fragment', 'dead'), ('result', 'hit'))
+        with tempfile.TemporaryDirectory() as directory:
+            dead = os.path.join(directory, f'{process.pid}-1.json')
+            live = os.path.join(directory, '1-1.json')
+            for path, hits, in_flight in ((dead, 5, 3), (live, 2, 4)):
+                with open(path, 'w') as file:
+                    json.dump([
+                        ['yatube_fragment_cache_total', counter, hits],
+                        ['yatube_auth_hash_in_flight', [], in_flight],
+                    ], file)
+            with override_settings(METRICS_DIR=directory):
+                merged = metrics.collect()
+                self.assertFalse(os.path.exists(dead))
+                self.assertEqual(metrics.collect(), merged)
+        self.assertEqual(merged['yatube_fragment_cache_total', counter], 7)
+        self.assertEqual(merged['yatube_auth_hash_in_flight', ()], 4)
+
+
+class SlowQueryLogTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log = os.path.join(directory.name, 'slow.jsonl')
+
+    def test_logs_view_fingerprint_and_plan_then_reports(self):
+        with override_settings(
+            SLOW_QUERY_LOG=self.log, SLOW_QUERY_THRESHOLD_MS=0
+        ):
+            Client().get(reverse('posts:group_list', args=['missing']))
+        with open(self.log) as file:
+            entries = [json.loads(line) for line in file]
+        group_query = next(
+            entry for entry in entries if 'posts_group' in entry['sql']
+        )
+        self.assertEqual(group_query['view'], 'posts:group_list')
+        self.assertIn('"posts_group"."slug" = %s', group_query['fingerprint'])
+        self.assertTrue(group_query['plan'])
+        out = StringIO()
+        call_command('slow_query_report', log=self.log, stdout=out)
+        self.assertIn('1. всего', out.getvalue())
+        self.assertIn('view: posts:group_list', out.getvalue())
+
+    def test_report_without_log_setting(self):
+        with self.assertRaisesMessage(CommandError, 'SLOW_QUERY_LOG'):
+            call_command('slow_query_report', stdout=StringIO())
+
+
+class ContentAddressedStorageTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.storage = ContentAddressedStorage(location=self.root)
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.storage.save('posts/cat.JPG', ContentFile(b'cat'))
+        second = self.storage.save('posts/copy.jpg', ContentFile(b'cat'))
+        other = self.storage.save('posts/cat.jpg', ContentFile(b'dog'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertTrue(is_content_addressed(first))
+        self.assertRegex(first, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.root, 'posts'))),
+            sorted({first.split('/')[1], other.split('/')[1]}),
+        )
+        self.storage.delete(first)
+        self.assertEqual(self.storage.open(second).read(), b'cat')
+
+    def test_resaved_file_stays_in_upload_directory(self):
+        first = self.storage.save('posts/cat.jpg', ContentFile(b'cat'))
+        second = self.storage.save(upload_name(first), ContentFile(b'dog'))
+        self.assertRegex(second, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(upload_name('posts/legacy.jpg'), 'posts/legacy.jpg')
+
+    def test_immutable_media_headers(self):
+        name = self.storage.save('posts/cat.jpg', ContentFile(b'cat'))
+        with open(os.path.join(self.root, 'posts', 'legacy.jpg'), 'wb'):
+            pass
+        request = RequestFactory().get('/media/')
+        response = serve_media(request, name, document_root=self.root)
+        self.assertIn('immutable', response['Cache-Control'])
+        response = serve_media(
+            request, 'posts/legacy.jpg', document_root=self.root
+        )
+        self.assertFalse(response.has_header('Cache-Control'))
+
+
+class DummyThumbnailEngineTest(TestCase):
+    def test_existing_picture_is_not_rendered(self):
+        buffer = BytesIO()
+        Image.new('RGB', (40, 30)).save(buffer, 'GIF')
+        name = default_storage.save('posts/tiny.gif', ContentFile(
+            buffer.getvalue()
+        ))
+        self.addCleanup(default_storage.delete, name)
+        with mock.patch.object(Engine, '_get_raw_data') as encode:
+            thumbnail = get_thumbnail(name, '960x339', crop='center')
+        self.addCleanup(default_storage.delete, thumbnail.name)
+        encode.assert_not_called()
+        self.assertEqual((thumbnail.width, thumbnail.height), (960, 339))
+        self.assertEqual(default_storage.open(thumbnail.name).read(), b'')
@@ -0,0 +1,91 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.engines.pil_engine import Engine
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+
+from . import metrics
+
+
+class LRUKVStore(KVStore):
+    """Хранилище sorl-thumbnail с LRU-кэшем в памяти процесса.
+
+    Найденные записи о миниатюрах держатся в памяти воркера, поэтому
+    повторный рендер ленты не ходит ни в кэш, ни в таблицу
+    thumbnail_kvstore. Отсутствующие ключи не запоминаются: миниатюру
+    мог создать другой воркер.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lru = OrderedDict()
+        self._lock = Lock()
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._lru[key] = value
+            self._lru.move_to_end(key)
+            while len(self._lru) > settings.THUMBNAIL_LRU_SIZE:
+                self._lru.popitem(last=False)
+
+    def _forget(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._lru.pop(key, None)
+
+    def _get_raw(self, key):
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                return self._lru[key]
+        value = super()._get_raw(key)
+        if value is not None:
+            self._remember(key, value)
+        return value
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        self._remember(key, value)
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        self._forget(*keys)
+
+    def clear(self, delete_thumbnails=False):
+        super().clear(delete_thumbnails)
+        with self._lock:
+            self._lru.clear()
+
+
+class TimedThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, замеряющий генерацию миниатюр."""
+
+    def _create_thumbnail(self, *args, **kwargs):
+        started = time.perf_counter()
+        super()._create_thumbnail(*args, **kwargs)
+        metrics.observe(
+            'yatube_thumbnail_seconds', time.perf_counter() - started
+        )
+
+
+class DummyEngine(Engine):
+    """Движок sorl-thumbnail для тестов.
+
+    Исходник только открывается (PIL читает заголовок, не пиксели),
+    миниатюра сохраняется пустым файлом с размером из geometry:
+    THUMBNAIL_DUMMY действует лишь на отсутствующие исходники.
+    """
+
+    def create(self, image, geometry, options):
+        return geometry
+
+    def write(self, image, options, thumbnail):
+        thumbnail.write(b'')
+
+    def get_image_size(self, image):
+        if isinstance(image, tuple):
+            return image
+        return super().get_image_size(image)
@@ -1,6 +1,17 @@
+import math
+import time
 from http import HTTPStatus
 
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse, HttpResponseBadRequest
 from django.shortcuts import render
+from django.views.static import serve
+
+from . import metrics
+from .sampling import (WINDOW_POLL, format_collapsed, profiler,
+                       read_deadline, window_stacks)
+from .storage import is_content_addressed
 
 
 def page_not_found(request, exception):
@@ -26,3 +37,68 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def profiler_stacks(request):
+    """Стеки семплирующего профайлера для flamegraph.pl.
+
+    Без параметров отдаёт накопленное этим воркером с прошлого
+    ?reset=1. ?seconds=N сразу отвечает 202 и открывает во всех
+    воркерах окно на N секунд, когда профилируются все запросы;
+    ?window отдаёт собранное за окно со всех воркеров, а пока окно
+    не закрылось — 202 с Retry-After.
+    """
+    if not settings.SAMPLING_PROFILER:
+        raise Http404
+    seconds = request.GET.get('seconds')
+    if seconds is not None:
+        if not seconds.isdigit():
+            return HttpResponseBadRequest()
+        seconds = min(int(seconds), settings.SAMPLING_PROFILER_MAX_SECONDS)
+        profiler.start_window(seconds)
+        return HttpResponse(
+            f'Окно открыто на {seconds} с\n',
+            content_type='text/plain; charset=utf-8',
+            status=HTTPStatus.ACCEPTED,
+        )
+    if 'window' in request.GET:
+        deadline = read_deadline()
+        if not deadline:
+            raise Http404
+        remaining = deadline + WINDOW_POLL - time.time()
+        if remaining > 0:
+            response = HttpResponse(
+                f'Окно закроется через {math.ceil(remaining)} с\n',
+                content_type='text/plain; charset=utf-8',
+                status=HTTPStatus.ACCEPTED,
+            )
+            response['Retry-After'] = math.ceil(remaining)
+            return response
+        stacks = window_stacks(deadline)
+    else:
+        stacks = profiler.snapshot(reset='reset' in request.GET)
+    return HttpResponse(
+        format_collapsed(stacks), content_type='text/plain; charset=utf-8'
+    )
+
+
+profiler_stacks.profiler_exempt = True
+
+
+def metrics_view(request):
+    """Метрики всех воркеров в текстовом формате Prometheus."""
+    return HttpResponse(
+        metrics.render(), content_type='text/plain; version=0.0.4'
+    )
+
+
+def serve_media(request, path, document_root=None):
+    """Раздача MEDIA при DEBUG; файлы под хешем содержимого
+    кэшируются навсегда, как это делает nginx в бою."""
+    response = serve(request, path, document_root=document_root)
+    if is_content_addressed(path):
+        response['Cache-Control'] = (
+            f'public, max-age={settings.MEDIA_IMMUTABLE_MAX_AGE}, immutable'
+        )
+    return response
@@ -1,6 +1,9 @@
-from django.contrib import admin
+from core.paginator import EstimatedCountPaginator
+from django.contrib import admin, messages
 
-from .models import Group, Post
+from .forms import ModerationActionForm
+from .models import Group, ModerationJob, Post
+from .moderation import queue_job
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -12,13 +15,102 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)  # Можно сразу выбирать
+    list_select_related = ('author', 'group')
+    raw_id_fields = ('author',)
     search_fields = ('text',)
     list_filter = ('created',)
+    date_hierarchy = 'created'
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    action_form = ModerationActionForm
+    actions = (
+        'delete_author_posts',
+        'move_to_group',
+        'purge_comments',
+    )
 
     def __str__(self) -> str:
         return self.text
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        """Список групп выбирается один раз на всю страницу,
+        а не для каждой строки list_editable."""
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'group':
+            if not hasattr(request, 'group_choices'):
+                request.group_choices = list(iter(field.choices))
+            field.choices = request.group_choices
+        return field
+
+    def queued(self, request, job):
+        self.message_user(
+            request,
+            f'Задача «{job.get_action_display()}» поставлена в очередь',
+        )
+
+    def delete_author_posts(self, request, queryset):
+        authors = queryset.values_list('author_id', flat=True)
+        self.queued(request, queue_job(
+            ModerationJob.DELETE_AUTHOR_POSTS, authors, request.user
+        ))
+    delete_author_posts.short_description = (
+        'Удалить все посты и комментарии авторов выбранных постов'
+    )
+
+    def move_to_group(self, request, queryset):
+        group = Group.objects.filter(
+            pk=request.POST.get('group') or None
+        ).first()
+        if group is None:
+            self.message_user(
+                request, 'Выберите группу', level=messages.ERROR
+            )
+            return
+        self.queued(request, queue_job(
+            ModerationJob.MOVE_TO_GROUP,
+            queryset.values_list('id', flat=True),
+            request.user,
+            group=group,
+        ))
+    move_to_group.short_description = 'Перенести выбранные посты в группу'
+
+    def purge_comments(self, request, queryset):
+        self.queued(request, queue_job(
+            ModerationJob.PURGE_COMMENTS,
+            queryset.values_list('id', flat=True),
+            request.user,
+        ))
+    purge_comments.short_description = 'Удалить комментарии выбранных постов'
+
+
+class ModerationJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'action',
+        'status',
+        'processed',
+        'total',
+        'created_by',
+        'created',
+        'finished',
+    )
+    list_filter = ('status', 'action')
+    readonly_fields = [
+        field.name for field in ModerationJob._meta.fields
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk', 'title', 'slug', 'posts_count', 'authors_count', 'last_post_at'
+    )
+    search_fields = ('title', 'slug')
+
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(ModerationJob, ModerationJobAdmin)
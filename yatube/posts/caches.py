@@ -0,0 +1,178 @@
+import copy
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+
+from .models import Follow, Group, Post
+
+LATEST_INDEX_KEY = 'posts:latest:index'
+LATEST_AUTHOR_KEY = 'posts:latest:author:{}'
+GROUP_VERSION_KEY = 'posts:group:version'
+GROUP_KEY = 'posts:group:{}:{}'
+GROUP_STATS_KEY = 'posts:group:stats:{}'
+FOLLOWING_KEY = 'posts:following:{}'
+
+GROUP_STATS = ('posts_count', 'authors_count', 'last_post_at')
+
+# slug -> (версия групп, группа): копия в памяти процесса, пока
+# версия групп в общем кэше не сменилась
+local_groups = {}
+
+
+def bump_latest(post):
+    """Сдвигает маркеры последнего поста после публикации."""
+    cache.set_many(
+        {
+            LATEST_INDEX_KEY: post.id,
+            LATEST_AUTHOR_KEY.format(post.author_id): post.id,
+        },
+        settings.LATEST_POST_TIMEOUT,
+    )
+
+
+def forget_latest(post):
+    """Сбрасывает маркеры после удаления поста: удалённый мог быть
+    последним, и маркер пересчитается по оставшимся."""
+    cache.delete_many(
+        [LATEST_INDEX_KEY, LATEST_AUTHOR_KEY.format(post.author_id)]
+    )
+
+
+def latest_post_id():
+    """id последнего поста общей ленты (0, если постов нет)."""
+    latest = cache.get(LATEST_INDEX_KEY)
+    if latest is None:
+        latest = Post.objects.aggregate(latest=Max('id'))['latest'] or 0
+        cache.set(LATEST_INDEX_KEY, latest, settings.LATEST_POST_TIMEOUT)
+    return latest
+
+
+def latest_post_id_for_authors(author_ids):
+    """id последнего поста среди авторов (для ленты подписок)."""
+    keys = {LATEST_AUTHOR_KEY.format(pk): pk for pk in author_ids}
+    found = cache.get_many(keys)
+    missing = [pk for key, pk in keys.items() if key not in found]
+    if missing:
+        latest = dict(
+            Post.objects.filter(author_id__in=missing)
+            .values_list('author_id')
+            .annotate(Max('id'))
+            .order_by()
+        )
+        computed = {
+            LATEST_AUTHOR_KEY.format(pk): latest.get(pk, 0) for pk in missing
+        }
+        cache.set_many(computed, settings.LATEST_POST_TIMEOUT)
+        found.update(computed)
+    return max(found.values(), default=0)
+
+
+def get_cached_group(slug):
+    """Группа по slug или None.
+
+    Строка группы берётся из памяти процесса, затем из общего кэша,
+    затем из БД. Сохранение и удаление группы сдвигают версию групп
+    в общем кэше, и копии во всех процессах устаревают. Статистика
+    (posts_count идёт в Paginator.count) хранится под своим ключом
+    общего кэша, его сбрасывают изменения постов. Обычный запрос —
+    один get_many к кэшу без обращений к БД.
+    """
+    entry = local_groups.get(slug)
+    keys = [GROUP_VERSION_KEY]
+    if entry is not None:
+        keys.append(GROUP_STATS_KEY.format(entry[1].id))
+    found = cache.get_many(keys)
+    version = found.get(GROUP_VERSION_KEY)
+    if version is None:
+        # Версии нет (сброс кэша): новая не совпадёт ни с одной
+        # версией уже закэшированных копий
+        cache.add(GROUP_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(GROUP_VERSION_KEY)
+    stats = None
+    if entry is not None and entry[0] == version:
+        group = entry[1]
+        stats = found.get(GROUP_STATS_KEY.format(group.id))
+    else:
+        group = cache.get(GROUP_KEY.format(version, slug))
+        if group is None:
+            group = Group.objects.filter(slug=slug).first()
+            if group is None:
+                return None
+            cache.set(
+                GROUP_KEY.format(version, slug), group,
+                settings.GROUP_CACHE_TIMEOUT,
+            )
+            stats = {field: getattr(group, field) for field in GROUP_STATS}
+            cache.set(
+                GROUP_STATS_KEY.format(group.id), stats,
+                settings.GROUP_CACHE_TIMEOUT,
+            )
+        local_groups[slug] = (version, group)
+        if stats is None:
+            stats = cache.get(GROUP_STATS_KEY.format(group.id))
+    if stats is None:
+        stats = Group.objects.filter(pk=group.id).values(*GROUP_STATS).first()
+        if stats is None:
+            return None
+        cache.set(
+            GROUP_STATS_KEY.format(group.id), stats,
+            settings.GROUP_CACHE_TIMEOUT,
+        )
+    group = copy.copy(group)
+    group.__dict__.update(stats)
+    return group
+
+
+def bump_group_version():
+    try:
+        cache.incr(GROUP_VERSION_KEY)
+    except ValueError:
+        cache.set(GROUP_VERSION_KEY, time.time_ns(), None)
+
+
+def forget_groups():
+    """Устаревает копии групп во всех процессах после коммита:
+    до него другой процесс снова закэшировал бы старую строку."""
+    transaction.on_commit(bump_group_version)
+
+
+def forget_group_stats(group_ids):
+    """Сбрасывает статистику групп в общем кэше после коммита."""
+    keys = [GROUP_STATS_KEY.format(pk) for pk in group_ids if pk is not None]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class FollowingSet(frozenset):
+    """id авторов, на которых подписан пользователь."""
+
+
+def get_following_ids(user_id):
+    """Подписки пользователя из кэша или одним values_list."""
+    key = FOLLOWING_KEY.format(user_id)
+    following = cache.get(key)
+    if following is None:
+        following = FollowingSet(
+            Follow.objects.filter(user_id=user_id)
+            .values_list('author_id', flat=True)
+        )
+        cache.set(key, following, settings.FOLLOWING_CACHE_TIMEOUT)
+    return following
+
+
+def forget_following(user_id):
+    cache.delete(FOLLOWING_KEY.format(user_id))
+
+
+def viewer_following_ids(request):
+    """Подписки текущего пользователя, загружаются раз за запрос."""
+    if not hasattr(request, 'following_ids'):
+        request.following_ids = (
+            get_following_ids(request.user.id)
+            if request.user.is_authenticated
+            else FollowingSet()
+        )
+    return request.following_ids
@@ -0,0 +1,16 @@
+from django.utils.functional import SimpleLazyObject
+
+from .caches import viewer_following_ids
+
+
+def following(request):
+    """Подписки зрителя для кнопок на карточках постов.
+
+    Ленивый объект: страницы без кнопок подписки не тратят на них
+    даже обращения к кэшу.
+    """
+    return {
+        'following_ids': SimpleLazyObject(
+            lambda: viewer_following_ids(request)
+        ),
+    }
@@ -1,15 +1,52 @@
 from django import forms
+from django.conf import settings
+from django.contrib.admin.helpers import ActionForm
 
-from .models import Comment, Post
+from . import spam
+from .models import Comment, Group, Post
 
 
-class PostForm(forms.ModelForm):
+class SpamFilterMixin:
+    """Отклоняет новый текст, если похожих за окно уже слишком много.
+
+    Проверка идёт в clean_text, до записи в БД и обработки картинки;
+    после сохранения view вызывает remember_text().
+    """
+
+    text_signature = None
+
+    def clean_text(self):
+        text = self.cleaned_data['text']
+        if settings.SPAM_FILTER and self.instance.pk is None:
+            self.text_signature = spam.signature(text)
+        if self.text_signature is not None:
+            self.text_duplicates = spam.duplicates(self.text_signature)
+            if self.text_duplicates >= settings.SPAM_DUPLICATES_LIMIT:
+                raise forms.ValidationError(
+                    'Очень похожий текст недавно уже публиковали'
+                )
+        return text
+
+    def remember_text(self):
+        if self.text_signature is not None:
+            spam.remember(self.text_signature, self.text_duplicates)
+
+
+class PostForm(SpamFilterMixin, forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image',)
 
 
-class CommentForm(forms.ModelForm):
+class CommentForm(SpamFilterMixin, forms.ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
+
+
+class ModerationActionForm(ActionForm):
+    group = forms.ModelChoiceField(
+        Group.objects.all(),
+        required=False,
+        label='Группа',
+    )
@@ -0,0 +1,343 @@
+"""Граф подписок в памяти процесса.
+
+Подписки хранятся в двух CSR-структурах (на кого подписан
+пользователь и кто подписан на автора): массив смещений по id
+пользователя и общий массив отсортированных id соседей. Проверка
+подписки — бинарный поиск по строке, O(log n). Изменения после
+загрузки копятся в дельтах и время от времени вливаются в массивы.
+
+Снимок графа пишется в файл FOLLOW_GRAPH_SNAPSHOT и открывается
+через mmap без копирования, так что новый воркер стартует быстро.
+Каждая подписка и отписка пишется в журнал FollowEvent и сдвигает
+версию графа в общем кэше. Процесс сверяет версию перед обращением
+и при расхождении доигрывает журнал с последнего известного id —
+без перестройки графа и без запросов к таблице Follow.
+"""
+
+import mmap
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+
+from .models import Follow, FollowEvent
+
+VERSION_KEY = 'posts:follow_graph:version'
+
+MAGIC = b'FGR2'
+# Сигнатура, максимальный id пользователя, число рёбер, последний
+# FollowEvent.id; размер кратен 4, поэтому массивы за ним выровнены
+HEADER = struct.Struct('<4sIIQ')
+
+
+class CSR:
+    """Списки смежности: соседи узла n — targets[offsets[n]:offsets[n+1]]."""
+
+    def __init__(self, offsets, targets):
+        self.offsets = offsets
+        self.targets = targets
+
+    @classmethod
+    def build(cls, pairs, size):
+        """pairs — пары (узел, сосед), отсортированные по обоим полям."""
+        offsets = array('I', bytes(4 * (size + 2)))
+        for node, _ in pairs:
+            offsets[node + 1] += 1
+        for node in range(1, len(offsets)):
+            offsets[node] += offsets[node - 1]
+        return cls(offsets, array('I', (target for _, target in pairs)))
+
+    def bounds(self, node):
+        if node + 1 >= len(self.offsets):
+            return 0, 0
+        return self.offsets[node], self.offsets[node + 1]
+
+    def row(self, node):
+        start, end = self.bounds(node)
+        return self.targets[start:end]
+
+    def degree(self, node):
+        start, end = self.bounds(node)
+        return end - start
+
+    def contains(self, node, target):
+        start, end = self.bounds(node)
+        index = bisect_left(self.targets, target, start, end)
+        return index < end and self.targets[index] == target
+
+
+class FollowGraph:
+    def __init__(self, followees, followers, last_event_id, edges):
+        self.lock = Lock()
+        self.followees = followees
+        self.followers = followers
+        self.last_event_id = last_event_id
+        self.base_edges = edges
+        # Версия из общего кэша, с которой граф сверен, и время сверки
+        self.version = None
+        self.synced_at = time.monotonic()
+        self.reset_delta()
+
+    def reset_delta(self):
+        # Рёбра, добавленные поверх массивов и удалённые из них
+        self.added = set()
+        self.removed = set()
+        self.added_by_user = defaultdict(set)
+        self.added_by_author = defaultdict(set)
+        self.removed_by_user = defaultdict(set)
+        self.removed_by_author = defaultdict(set)
+
+    @classmethod
+    def from_pairs(cls, pairs, last_event_id):
+        """Граф из пар (подписчик, автор)."""
+        pairs = sorted(set(pairs))
+        size = max((max(pair) for pair in pairs), default=0)
+        followees = CSR.build(pairs, size)
+        followers = CSR.build(
+            sorted((author, user) for user, author in pairs), size
+        )
+        return cls(followees, followers, last_event_id, len(pairs))
+
+    @classmethod
+    def from_db(cls):
+        """Граф по таблице Follow.
+
+        Id события читается до таблицы: изменения, попавшие между
+        запросами, sync доиграет ещё раз, и это безопасно.
+        """
+        last_event_id = FollowEvent.objects.aggregate(
+            last=Max('id')
+        )['last'] or 0
+        return cls.from_pairs(
+            Follow.objects.values_list('user_id', 'author_id'),
+            last_event_id,
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Граф из снимка; массивы остаются в файле, отображённом mmap."""
+        with open(path, 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, size, edges, last_event_id = HEADER.unpack_from(mapped)
+        if magic != MAGIC:
+            raise ValueError(f'{path} не снимок графа подписок')
+        words = memoryview(mapped)[HEADER.size:].cast('I')
+        sections = []
+        start = 0
+        for length in (size + 2, edges, size + 2, edges):
+            sections.append(words[start:start + length])
+            start += length
+        return cls(
+            CSR(sections[0], sections[1]),
+            CSR(sections[2], sections[3]),
+            last_event_id,
+            edges,
+        )
+
+    def save(self, path):
+        """Пишет снимок атомарно: читатели видят старый или новый файл."""
+        self.compact()
+        size = len(self.followees.offsets) - 2
+        with open(path + '.tmp', 'wb') as file:
+            file.write(HEADER.pack(
+                MAGIC, size, self.base_edges, self.last_event_id
+            ))
+            for part in (
+                self.followees.offsets, self.followees.targets,
+                self.followers.offsets, self.followers.targets,
+            ):
+                file.write(bytes(part))
+        os.replace(path + '.tmp', path)
+
+    def pairs(self):
+        """Все рёбра (подписчик, автор) с учётом дельт."""
+        size = len(self.followees.offsets) - 2
+        for user in range(size + 1):
+            for author in self.followees.row(user):
+                if (user, author) not in self.removed:
+                    yield user, author
+        yield from self.added
+
+    def compact(self):
+        """Вливает дельты в массивы."""
+        with self.lock:
+            if not self.added and not self.removed:
+                return
+            graph = FollowGraph.from_pairs(
+                list(self.pairs()), self.last_event_id
+            )
+            self.followees = graph.followees
+            self.followers = graph.followers
+            self.base_edges = graph.base_edges
+            self.reset_delta()
+
+    def add(self, user, author):
+        with self.lock:
+            pair = (user, author)
+            if pair in self.removed:
+                self.removed.discard(pair)
+                self.removed_by_user[user].discard(author)
+                self.removed_by_author[author].discard(user)
+            elif not self.followees.contains(user, author):
+                self.added.add(pair)
+                self.added_by_user[user].add(author)
+                self.added_by_author[author].add(user)
+        self.maybe_compact()
+
+    def remove(self, user, author):
+        with self.lock:
+            pair = (user, author)
+            if pair in self.added:
+                self.added.discard(pair)
+                self.added_by_user[user].discard(author)
+                self.added_by_author[author].discard(user)
+            elif self.followees.contains(user, author):
+                self.removed.add(pair)
+                self.removed_by_user[user].add(author)
+                self.removed_by_author[author].add(user)
+        self.maybe_compact()
+
+    def maybe_compact(self):
+        if len(self.added) + len(self.removed) > (
+            settings.FOLLOW_GRAPH_DELTA_LIMIT
+        ):
+            self.compact()
+
+    def edges(self):
+        return self.base_edges + len(self.added) - len(self.removed)
+
+    def follows(self, user, author):
+        pair = (user, author)
+        if pair in self.added:
+            return True
+        if pair in self.removed:
+            return False
+        return self.followees.contains(user, author)
+
+    def followees_of(self, user):
+        """Отсортированные id авторов, на которых подписан user."""
+        removed = self.removed_by_user.get(user, ())
+        base = [
+            author for author in self.followees.row(user)
+            if author not in removed
+        ]
+        return sorted(base + list(self.added_by_user.get(user, ())))
+
+    def followers_count(self, author):
+        return (
+            self.followers.degree(author)
+            + len(self.added_by_author.get(author, ()))
+            - len(self.removed_by_author.get(author, ()))
+        )
+
+    def suggestions(self, user, limit):
+        """Авторы, на которых чаще всего подписаны авторы из подписок
+        user, кроме уже читаемых и его самого."""
+        following = set(self.followees_of(user))
+        counts = Counter()
+        for followee in following:
+            counts.update(self.followees_of(followee))
+        for author in following | {user}:
+            counts.pop(author, None)
+        ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+        return [author for author, _ in ranked[:limit]]
+
+    def sync(self):
+        """Доигрывает журнал FollowEvent с последнего известного id.
+
+        Последние FOLLOW_GRAPH_REPLAY событий читаются повторно:
+        транзакция могла закоммитить событие позже событий с большими
+        id. Повтор безопасен — события применяются по порядку, и
+        состояние пары задаёт последнее из них.
+        """
+        events = FollowEvent.objects.filter(
+            id__gt=self.last_event_id - settings.FOLLOW_GRAPH_REPLAY
+        ).order_by('id').values_list('id', 'user_id', 'author_id', 'followed')
+        for event_id, user, author, followed in events:
+            if followed:
+                self.add(user, author)
+            else:
+                self.remove(user, author)
+            self.last_event_id = max(self.last_event_id, event_id)
+        self.synced_at = time.monotonic()
+        return self
+
+
+graph = None
+graph_lock = Lock()
+
+
+def load_graph():
+    path = settings.FOLLOW_GRAPH_SNAPSHOT
+    if path and os.path.exists(path):
+        try:
+            return FollowGraph.load(path).sync()
+        except ValueError:
+            # Снимок старого формата: его перепишет follow_graph_snapshot
+            pass
+    return FollowGraph.from_db()
+
+
+def bump_version():
+    """Сдвигает версию графа в общем кэше и возвращает новую.
+
+    Пропавший из кэша ключ заводится заново от текущего времени, а
+    не с единицы, чтобы не совпасть с версией, уже виденной графом.
+    """
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), None)
+        return None
+
+
+def follow_graph():
+    """Граф подписок процесса, сверенный с версией в общем кэше.
+
+    Версию между процессами передаёт только общий кэш (memcached в
+    production_settings); без него граф всё равно доигрывает журнал
+    раз в FOLLOW_GRAPH_SYNC_INTERVAL секунд.
+    """
+    global graph
+    version = cache.get(VERSION_KEY)
+    with graph_lock:
+        if graph is None:
+            graph = load_graph()
+        elif graph.version != version or (
+            time.monotonic() - graph.synced_at
+            > settings.FOLLOW_GRAPH_SYNC_INTERVAL
+        ):
+            graph.sync()
+        graph.version = version
+        return graph
+
+
+def follow_changed(user, author, created):
+    """Пишет подписку или отписку в журнал, а после коммита сдвигает
+    версию и применяет изменение к загруженному графу."""
+    FollowEvent.objects.create(
+        user_id=user, author_id=author, followed=created
+    )
+
+    def apply():
+        version = bump_version()
+        with graph_lock:
+            if graph is None:
+                return
+            if created:
+                graph.add(user, author)
+            else:
+                graph.remove(user, author)
+            # Версию сдвинуло только это изменение: сверяться не с чем
+            if graph.version is not None and graph.version + 1 == version:
+                graph.version = version
+
+    transaction.on_commit(apply)
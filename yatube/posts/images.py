@@ -0,0 +1,216 @@
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from io import BytesIO
+from threading import Lock
+
+from core import metrics
+from core.storage import upload_name
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+PIL_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+# Оригиналы в этих форматах пересжимаются без метаданных
+NORMALIZED_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+
+def variant_name(source_name, width, fmt):
+    """Имя файла варианта картинки заданной ширины и формата."""
+    root = os.path.splitext(os.path.basename(source_name))[0]
+    return f'posts/variants/{root}_{width}.{fmt}'
+
+
+def image_options():
+    """Параметры обработки: дочерний процесс не читает настройки Django."""
+    return {
+        'max_size': settings.POST_IMAGE_MAX_SIZE,
+        'quality': settings.POST_IMAGE_QUALITY,
+        'widths': settings.POST_IMAGE_WIDTHS,
+        'formats': settings.POST_IMAGE_FORMATS,
+        'ratio': settings.POST_IMAGE_RATIO,
+    }
+
+
+def render_variants(image, options):
+    """Нарезает картинку на несколько ширин во всех форматах.
+
+    Кадрирование повторяет прежний вид карточки (ratio, по центру).
+    Возвращает список (ширина, формат, байты).
+    """
+    ratio_width, ratio_height = options['ratio']
+    rendered = []
+    for width in options['widths']:
+        height = round(width * ratio_height / ratio_width)
+        resized = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        for fmt in options['formats']:
+            buffer = BytesIO()
+            resized.save(buffer, PIL_FORMATS[fmt], quality=options['quality'])
+            rendered.append((width, fmt, buffer.getvalue()))
+    return rendered
+
+
+def process_image(data, options):
+    """Нормализует загруженную картинку и нарезает её варианты.
+
+    Работает только с байтами, поэтому выполняется в пуле процессов.
+    Поворот из EXIF применяется к пикселям, метаданные (EXIF, GPS,
+    комментарии) не переносятся, размеры ограничены max_size.
+    Оригиналы вне NORMALIZED_FORMATS (например, анимированные GIF)
+    не меняются. Возвращает (новые байты оригинала или None,
+    варианты, секунды).
+    """
+    started = time.perf_counter()
+    source = Image.open(BytesIO(data))
+    fmt = source.format
+    image = ImageOps.exif_transpose(source)
+    normalized = None
+    if fmt in NORMALIZED_FORMATS:
+        image.thumbnail(options['max_size'], Image.LANCZOS)
+        params = {
+            'optimize': True,
+            'icc_profile': source.info.get('icc_profile'),
+        }
+        if fmt == 'JPEG':
+            image = image.convert('RGB')
+            params.update(quality=options['quality'], progressive=True)
+        elif fmt == 'WEBP':
+            params['quality'] = options['quality']
+        buffer = BytesIO()
+        image.save(buffer, fmt, **params)
+        normalized = buffer.getvalue()
+    rendered = render_variants(image.convert('RGB'), options)
+    return normalized, rendered, time.perf_counter() - started
+
+
+def store_processed(posts, name, normalized, rendered, seconds):
+    """Сохраняет результат обработки и записывает его в пост.
+
+    Хранилище по хешу содержимого кладёт нормализованный файл под
+    новым именем, и пост переводится на него. Прежний файл delete
+    хранилища не трогает: закэшированные страницы открывают его по
+    старому адресу, пока его не уберёт collect_media_garbage.
+    Если картинку поста за это время заменили, результат
+    не записывается.
+    Возвращает (имя оригинала, JSON вариантов) или None.
+    """
+    metrics.observe('yatube_image_variants_seconds', seconds)
+    if not posts.filter(image=name).exists():
+        return None
+    if normalized is not None:
+        default_storage.delete(name)
+        saved = default_storage.save(
+            upload_name(name), ContentFile(normalized)
+        )
+        if saved != name:
+            posts.filter(image=name).update(image=saved)
+            name = saved
+    variants = {}
+    for width, fmt, content in rendered:
+        variants.setdefault(width, {'width': width})[fmt] = (
+            default_storage.save(
+                variant_name(name, width, fmt), ContentFile(content)
+            )
+        )
+    dumped = dump_variants(list(variants.values()))
+    posts.filter(image=name).update(image_variants=dumped)
+    return name, dumped
+
+
+def read_image(name):
+    with default_storage.open(name, 'rb') as file:
+        return file.read()
+
+
+def process_post_image(posts, name):
+    """Обрабатывает картинку сразу, см. store_processed."""
+    return store_processed(
+        posts, name, *process_image(read_image(name), image_options())
+    )
+
+
+executor = None
+executor_lock = Lock()
+
+
+def get_executor():
+    global executor
+    with executor_lock:
+        if executor is None:
+            # spawn: дочерний процесс не наследует потоки и соединения
+            # с БД родителя
+            executor = ProcessPoolExecutor(
+                settings.IMAGE_PROCESSING_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return executor
+
+
+def finish(posts, name, submitter, future):
+    try:
+        store_processed(posts, name, *future.result())
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s', name)
+    finally:
+        # Колбэк выполняется в служебном потоке пула, если задача не
+        # успела завершиться раньше add_done_callback
+        if threading.get_ident() != submitter:
+            connections.close_all()
+
+
+def schedule_image(posts, name):
+    """Ставит обработку картинки поста в очередь.
+
+    posts — QuerySet из одного поста. В режиме IMAGE_PROCESSING='sync'
+    и в демоническом процессе картинка обрабатывается сразу и
+    возвращается результат store_processed, иначе — после коммита
+    в пуле процессов, а до тех пор страницы показывают миниатюру
+    sorl-thumbnail.
+    """
+    # Демоническому процессу (воркер manage.py test --parallel и т.п.)
+    # нельзя заводить дочерние процессы
+    if (
+        settings.IMAGE_PROCESSING == 'sync'
+        or multiprocessing.current_process().daemon
+    ):
+        return process_post_image(posts, name)
+
+    def submit():
+        future = get_executor().submit(
+            process_image, read_image(name), image_options()
+        )
+        future.add_done_callback(
+            partial(finish, posts, name, threading.get_ident())
+        )
+
+    transaction.on_commit(submit)
+    return None
+
+
+def dump_variants(variants):
+    return json.dumps(variants) if variants else ''
+
+
+def load_variants(raw):
+    return json.loads(raw) if raw else []
+
+
+def srcset(variants, fmt):
+    """Строка для атрибута srcset из вариантов одного формата."""
+    return ', '.join(
+        f'{default_storage.url(variant[fmt])} {variant["width"]}w'
+        for variant in variants
+        if fmt in variant
+    )
@@ -0,0 +1,77 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from posts.models import ArchivedComment, ArchivedPost, Comment, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит посты старше горизонта вместе с комментариями '
+        'в архивные таблицы. Каждая пачка — отдельная транзакция.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.POSTS_ARCHIVE_AFTER_DAYS,
+            help='Возраст постов в днях, после которого они уходят в архив',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.POSTS_ARCHIVE_BATCH_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        horizon = timezone.now() - timedelta(days=options['days'])
+        batch_size = options['batch_size']
+        total = 0
+        while True:
+            with transaction.atomic():
+                posts = list(
+                    Post.objects.filter(created__lt=horizon)
+                    .order_by('id')[:batch_size]
+                )
+                if not posts:
+                    break
+                self.archive(posts, batch_size)
+            total += len(posts)
+            self.stdout.write(f'В архиве постов: {total}')
+        self.stdout.write(self.style.SUCCESS(f'Готово, перенесено {total}'))
+
+    @staticmethod
+    def archive(posts, batch_size):
+        ids = [post.id for post in posts]
+        ArchivedPost.objects.bulk_create(
+            ArchivedPost(
+                id=post.id,
+                text=post.text,
+                created=post.created,
+                group_id=post.group_id,
+                author_id=post.author_id,
+                image=post.image.name,
+                image_variants=post.image_variants,
+            )
+            for post in posts
+        )
+        comments = Comment.objects.filter(post_id__in=ids).order_by('id')
+        ArchivedComment.objects.bulk_create(
+            (
+                ArchivedComment(
+                    id=comment.id,
+                    post_id=comment.post_id,
+                    author_id=comment.author_id,
+                    text=comment.text,
+                    created=comment.created,
+                )
+                for comment in comments.iterator(chunk_size=batch_size)
+            ),
+            batch_size=batch_size,
+        )
+        comments.delete()
+        Post.objects.filter(id__in=ids).delete()
@@ -0,0 +1,62 @@
+import os
+import time
+
+from core.storage import is_content_addressed
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from posts.models import ArchivedPost, Post
+
+
+def referenced_names():
+    """Картинки и их варианты, на которые ссылаются посты и архив."""
+    names = set()
+    for model in (Post, ArchivedPost):
+        for image, variants in model.objects.exclude(image='').values_list(
+            'image', 'image_variants'
+        ).iterator():
+            names.add(image)
+            for variant in model(image_variants=variants).variants:
+                names.update(
+                    value for key, value in variant.items() if key != 'width'
+                )
+    return names
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет файлы хранилища по хешу содержимого, на которые не '
+        'ссылается ни один пост: delete хранилища их не трогает, '
+        'потому что один файл бывает общим у нескольких постов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=float,
+            default=24,
+            help='Не трогать файлы моложе стольких часов: их могла '
+                 'только что сохранить ещё не закоммиченная загрузка',
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        referenced = referenced_names()
+        horizon = time.time() - options['min_age'] * 3600
+        root = default_storage.path('')
+        removed = 0
+        for directory, _, files in os.walk(default_storage.path('posts')):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                if (
+                    not is_content_addressed(name)
+                    or name in referenced
+                    or os.path.getmtime(path) > horizon
+                ):
+                    continue
+                removed += 1
+                self.stdout.write(name)
+                if not options['dry_run']:
+                    os.remove(path)
+        self.stdout.write(self.style.SUCCESS(f'Удалено файлов: {removed}'))
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.graph import FollowGraph
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит граф подписок по таблице Follow и сохраняет снимок, '
+        'который воркеры открывают через mmap при старте.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=settings.FOLLOW_GRAPH_SNAPSHOT)
+
+    def handle(self, *args, **options):
+        if not options['path']:
+            raise CommandError('Не задан путь снимка FOLLOW_GRAPH_SNAPSHOT')
+        graph = FollowGraph.from_db()
+        graph.save(options['path'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Снимок {options["path"]}: {graph.edges()} подписок'
+        ))
@@ -0,0 +1,278 @@
+import random
+import time
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from PIL import Image
+
+from posts.models import Comment, Follow, Group, Post
+from posts.stats import refresh_group_stats
+
+User = get_user_model()
+
+WORDS = (
+    'яндекс практикум пост лента автор группа подписка комментарий '
+    'картинка котики кофе погода город новости код python django '
+    'тест релиз выходные музыка фильм книга спорт путешествие'
+).split()
+
+# Тексты и даты берутся из заранее собранных пулов: генерация
+# каждого значения заново стоила больше самой вставки
+POOL_SIZE = 4096
+
+
+def moment(value):
+    """Аргумент --now: дата и время ISO 8601, без пояса — в TIME_ZONE."""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(value)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет БД синтетическими пользователями, постами, '
+        'комментариями и подписками с реалистичным перекосом '
+        '(популярные авторы, горячие группы, всплески комментариев).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=5000)
+        parser.add_argument(
+            '--images',
+            type=int,
+            default=0,
+            help='Сколько разных картинок сгенерировать для постов',
+        )
+        parser.add_argument(
+            '--image-ratio',
+            type=float,
+            default=0.1,
+            help='Доля постов с картинкой',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='За сколько дней распределить даты постов',
+        )
+        parser.add_argument(
+            '--now',
+            type=moment,
+            help='От какого момента отсчитывать даты (по умолчанию — '
+                 'сейчас); с одинаковыми --seed и --now данные '
+                 'совпадают вплоть до дат',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=50000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = f'seed{options["seed"]}_'
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(
+                f'Данные с --seed={options["seed"]} уже есть в БД'
+            )
+        self.now = options['now'] or timezone.now()
+        self.times = [
+            connection.ops.adapt_datetimefield_value(self.now - timedelta(
+                seconds=self.rng.random() * options['days'] * 86400
+            ))
+            for _ in range(POOL_SIZE)
+        ]
+        self.texts = {}
+        started = time.monotonic()
+        if connection.vendor == 'sqlite' and not connection.in_atomic_block:
+            # Генерация данных не требует надёжности каждого коммита,
+            # а крупный кэш страниц ускоряет обновление индексов
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA synchronous = OFF')
+                cursor.execute('PRAGMA cache_size = -262144')
+        users, popularity = self.create_users(options['users'])
+        groups = self.create_groups(options['groups'])
+        images = self.create_images(options['images'])
+        posts, heat = self.create_posts(
+            options['posts'], users, popularity, groups,
+            images, options['image_ratio'],
+        )
+        # Посты вставлены в обход сигналов
+        refresh_group_stats(groups)
+        rows = len(users) + len(groups) + len(posts)
+        rows += self.create_comments(options['comments'], users, posts, heat)
+        rows += self.create_follows(options['follows'], users, popularity)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано строк: {rows} за {elapsed:.1f} с '
+            f'({rows / max(elapsed, 1e-9):.0f} строк/с)'
+        ))
+
+    def insert(self, model, fields, rows, ignore_conflicts=False):
+        """Вставляет строки пачками, каждая пачка — одна транзакция.
+
+        bulk_create на SQLite упирается в подготовку каждого значения
+        (~10 тыс. строк/с), поэтому пачка уходит одним executemany.
+        """
+        ops = connection.ops
+        columns = ', '.join(
+            ops.quote_name(model._meta.get_field(name).column)
+            for name in fields
+        )
+        sql = '{} {} ({}) VALUES ({}) {}'.format(
+            ops.insert_statement(ignore_conflicts=ignore_conflicts),
+            ops.quote_name(model._meta.db_table),
+            columns,
+            ', '.join(['%s'] * len(fields)),
+            ops.ignore_conflicts_suffix_sql(ignore_conflicts=ignore_conflicts),
+        )
+        for start in range(0, len(rows), self.batch_size):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, rows[start:start + self.batch_size])
+
+    def new_ids(self, model, after):
+        return list(
+            model.objects.filter(id__gt=after)
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+
+    def last_id(self, model):
+        last = model.objects.order_by('-id').values_list('id').first()
+        return last[0] if last else 0
+
+    def powerlaw_weights(self, count, alpha):
+        """Кумулятивные веса с хвостом Парето: немногие очень популярны."""
+        return list(accumulate(
+            self.rng.paretovariate(alpha) for _ in range(count)
+        ))
+
+    def random_times(self, count):
+        return self.rng.choices(self.times, k=count)
+
+    def random_texts(self, low, high, count):
+        if (low, high) not in self.texts:
+            rng = self.rng
+            self.texts[low, high] = [
+                ' '.join(rng.choices(WORDS, k=rng.randint(low, high)))
+                for _ in range(POOL_SIZE)
+            ]
+        return self.rng.choices(self.texts[low, high], k=count)
+
+    def create_users(self, count):
+        after = self.last_id(User)
+        joined = connection.ops.adapt_datetimefield_value(self.now)
+        self.insert(
+            User,
+            (
+                'username', 'password', 'first_name', 'last_name', 'email',
+                'is_superuser', 'is_staff', 'is_active', 'date_joined',
+            ),
+            [
+                (f'{self.prefix}{i}', '!', '', '', '', False, False, True,
+                 joined)
+                for i in range(count)
+            ],
+        )
+        users = self.new_ids(User, after)
+        return users, self.powerlaw_weights(len(users), alpha=1.2)
+
+    def create_groups(self, count):
+        after = self.last_id(Group)
+        self.insert(
+            Group,
+            ('title', 'slug', 'description', 'posts_count', 'authors_count'),
+            [
+                (
+                    f'Группа {self.prefix}{i}',
+                    f'{self.prefix}{i}'.replace('_', '-'),
+                    description,
+                    0,
+                    0,
+                )
+                for i, description in enumerate(
+                    self.random_texts(5, 20, count)
+                )
+            ],
+        )
+        return self.new_ids(Group, after)
+
+    def create_images(self, count):
+        names = []
+        for i in range(count):
+            buffer = BytesIO()
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            Image.new('RGB', (1280, 720), color).save(buffer, 'JPEG')
+            names.append(default_storage.save(
+                f'posts/{self.prefix}{i}.jpg',
+                ContentFile(buffer.getvalue()),
+            ))
+        return names
+
+    def create_posts(self, count, users, popularity, groups, images, ratio):
+        # Горячие группы: вес группы убывает как 1 / ранг (закон Ципфа),
+        # 30% постов без группы
+        zipf = [1 / rank for rank in range(1, len(groups) + 1)]
+        group_weights = [0.3 * sum(zipf) / 0.7] + zipf
+        image_weights = [1]
+        if images:
+            image_weights = [1 - ratio] + [ratio / len(images)] * len(images)
+        after = self.last_id(Post)
+        self.insert(
+            Post,
+            ('text', 'created', 'author', 'group', 'image', 'image_variants'),
+            [
+                (*row, '') for row in zip(
+                    self.random_texts(10, 80, count),
+                    self.random_times(count),
+                    self.rng.choices(users, cum_weights=popularity, k=count),
+                    self.rng.choices([None] + groups, group_weights, k=count),
+                    self.rng.choices([''] + images, image_weights, k=count),
+                )
+            ],
+        )
+        post_ids = self.new_ids(Post, after)
+        return post_ids, self.powerlaw_weights(len(post_ids), alpha=0.8)
+
+    def create_comments(self, count, users, posts, heat):
+        if not posts:
+            return 0
+        # Всплески: большинство комментариев приходится на горячие посты
+        self.insert(
+            Comment,
+            ('post', 'author', 'text', 'created'),
+            list(zip(
+                self.rng.choices(posts, cum_weights=heat, k=count),
+                self.rng.choices(users, k=count),
+                self.random_texts(3, 30, count),
+                self.random_times(count),
+            )),
+        )
+        return count
+
+    def create_follows(self, count, users, popularity):
+        pairs = set()
+        attempts = 0
+        while len(pairs) < count and attempts < count * 10:
+            attempts += 1
+            user = self.rng.choice(users)
+            author = self.rng.choices(users, cum_weights=popularity)[0]
+            if user != author:
+                pairs.add((user, author))
+        self.insert(
+            Follow, ('user', 'author'), sorted(pairs), ignore_conflicts=True
+        )
+        return len(pairs)
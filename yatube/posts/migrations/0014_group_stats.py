@@ -0,0 +1,43 @@
+# Generated by Django 2.2.16 on 2026-10-19 19:48
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def fill_group_stats(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    for group in Group.objects.all():
+        Group.objects.filter(pk=group.pk).update(
+            **Post.objects.filter(group=group).aggregate(
+                posts_count=Count('id'),
+                authors_count=Count('author', distinct=True),
+                last_post_at=Max('created'),
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_moderationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='authors_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Авторов'),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='last_post_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Последний пост'),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Постов'),
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
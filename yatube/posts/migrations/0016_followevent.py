@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-19 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_baseline_model_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.PositiveIntegerField()),
+                ('author_id', models.PositiveIntegerField()),
+                ('followed', models.BooleanField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
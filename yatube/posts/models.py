@@ -1,13 +1,26 @@
+from core import metrics
 from core.models import CreatedModel
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .images import load_variants, schedule_image
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=30, unique=True)
     description = models.TextField()
+    # Статистика ведётся сигналами posts.signals, см. posts/stats.py
+    posts_count = models.PositiveIntegerField(
+        'Постов', default=0, editable=False
+    )
+    authors_count = models.PositiveIntegerField(
+        'Авторов', default=0, editable=False
+    )
+    last_post_at = models.DateTimeField(
+        'Последний пост', null=True, blank=True, editable=False
+    )
 
     class Meta:
         verbose_name = 'Группа'
@@ -47,6 +60,12 @@ class Post(CreatedModel):
         null=True,
         help_text='Загрузите картинку',
     )
+    image_variants = models.TextField(
+        'Варианты картинки',
+        blank=True,
+        editable=False,
+        help_text='JSON с уменьшенными копиями картинки',
+    )
 
     class Meta:
         ordering = ['-created']
@@ -56,6 +75,25 @@ class Post(CreatedModel):
     def __str__(self) -> str:
         return self.text[:settings.LETTERS_ON_POST]
 
+    def save(self, *args, **kwargs):
+        """Новую картинку отправляет на обработку: нормализация
+        оригинала и нарезка вариантов (posts/images.py)."""
+        image_uploaded = bool(self.image) and not self.image._committed
+        if not self.image or image_uploaded:
+            self.image_variants = ''
+        super().save(*args, **kwargs)
+        if image_uploaded:
+            metrics.observe('yatube_upload_bytes', self.image.size)
+            processed = schedule_image(
+                Post.objects.filter(pk=self.pk), self.image.name
+            )
+            if processed is not None:
+                self.image.name, self.image_variants = processed
+
+    @property
+    def variants(self):
+        return load_variants(self.image_variants)
+
 
 class Comment(CreatedModel):
     post = models.ForeignKey(
@@ -93,3 +131,139 @@ class Follow(models.Model):
                 name='unique_follow',
             )
         ]
+
+
+class FollowEvent(models.Model):
+    """Запись журнала подписок и отписок: по нему процессы догоняют
+    свой граф подписок (posts/graph.py).
+
+    Журнал только пополняется. Id пользователей — простые числа, а не
+    внешние ключи, чтобы удаление пользователя не стирало его отписки.
+    """
+    user_id = models.PositiveIntegerField()
+    author_id = models.PositiveIntegerField()
+    followed = models.BooleanField()
+    created = models.DateTimeField(auto_now_add=True)
+
+
+class ArchivedPost(models.Model):
+    """Пост, перенесённый из горячей таблицы командой archive_posts."""
+    text = models.TextField('Текст поста')
+    created = models.DateTimeField('Дата создания')
+    archived = models.DateTimeField('Дата архивации', auto_now_add=True)
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='archived_posts',
+        verbose_name='Группа',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_posts',
+        verbose_name='Автор',
+    )
+    image = models.ImageField(
+        'Картинка',
+        upload_to='posts/',
+        blank=True,
+        null=True,
+    )
+    image_variants = models.TextField('Варианты картинки', blank=True)
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name = 'Архивный пост'
+        verbose_name_plural = 'Архивные посты'
+
+    def __str__(self) -> str:
+        return self.text[:settings.LETTERS_ON_POST]
+
+    @property
+    def variants(self):
+        return load_variants(self.image_variants)
+
+
+class ArchivedComment(models.Model):
+    post = models.ForeignKey(
+        ArchivedPost,
+        on_delete=models.CASCADE,
+        related_name='comments',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_comments',
+    )
+    text = models.TextField('Текст')
+    created = models.DateTimeField('Дата создания')
+
+
+class ModerationJob(CreatedModel):
+    """Массовая операция модерации, которую выполняет
+    команда run_moderation_jobs пачками в фоне."""
+    DELETE_AUTHOR_POSTS = 'delete_author_posts'
+    MOVE_TO_GROUP = 'move_to_group'
+    PURGE_COMMENTS = 'purge_comments'
+    ACTIONS = (
+        (DELETE_AUTHOR_POSTS, 'Удалить посты и комментарии авторов'),
+        (MOVE_TO_GROUP, 'Перенести посты в группу'),
+        (PURGE_COMMENTS, 'Удалить комментарии к постам'),
+    )
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    action = models.CharField('Действие', max_length=30, choices=ACTIONS)
+    target_ids = models.TextField(
+        'id объектов',
+        help_text='JSON-список id авторов или постов',
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name='+',
+        verbose_name='Группа',
+    )
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='+',
+        verbose_name='Модератор',
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+    )
+    total = models.PositiveIntegerField('Всего строк', default=0)
+    processed = models.PositiveIntegerField('Обработано', default=0)
+    # Обновляется после каждой пачки; задача, которая давно не
+    # отмечалась, считается брошенной и берётся заново
+    heartbeat = models.DateTimeField(
+        'Последняя пачка', blank=True, null=True, editable=False
+    )
+    finished = models.DateTimeField('Завершено', blank=True, null=True)
+    error = models.TextField('Ошибка', blank=True)
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name = 'Задача модерации'
+        verbose_name_plural = 'Задачи модерации'
+
+    def __str__(self) -> str:
+        return f'{self.get_action_display()} ({self.get_status_display()})'
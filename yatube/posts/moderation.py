@@ -0,0 +1,128 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Comment, Follow, ModerationJob, Post
+from .stats import refresh_group_stats
+
+
+def queue_job(action, target_ids, user, group=None):
+    return ModerationJob.objects.create(
+        action=action,
+        target_ids=json.dumps(sorted(set(target_ids))),
+        group=group,
+        created_by=user,
+    )
+
+
+def chunked_delete(queryset, chunk_size, job):
+    """Удаляет строки пачками, каждая пачка — своя транзакция.
+
+    Каскад (комментарии удаляемых постов) ограничен той же пачкой.
+    """
+    while True:
+        ids = list(
+            queryset.order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return
+        with transaction.atomic():
+            queryset.model.objects.filter(id__in=ids).delete()
+        progress(job, len(ids))
+
+
+def progress(job, rows):
+    job.processed += rows
+    job.heartbeat = timezone.now()
+    job.save(update_fields=['processed', 'heartbeat'])
+
+
+def delete_author_posts(job, target_ids, chunk_size):
+    posts = Post.objects.filter(author_id__in=target_ids)
+    # Комментарии к самим постам уйдут каскадом вместе с ними
+    comments = Comment.objects.filter(author_id__in=target_ids).exclude(
+        post__author_id__in=target_ids
+    )
+    # Подписки авторов и на авторов: иначе их одним каскадом удалит
+    # удаление самих пользователей
+    follows = Follow.objects.filter(
+        Q(user_id__in=target_ids) | Q(author_id__in=target_ids)
+    )
+    job.total = posts.count() + comments.count() + follows.count()
+    job.save(update_fields=['total'])
+    chunked_delete(posts, chunk_size, job)
+    chunked_delete(comments, chunk_size, job)
+    chunked_delete(follows, chunk_size, job)
+
+
+def move_to_group(job, target_ids, chunk_size):
+    job.total = len(target_ids)
+    job.save(update_fields=['total'])
+    for start in range(0, len(target_ids), chunk_size):
+        ids = target_ids[start:start + chunk_size]
+        posts = Post.objects.filter(id__in=ids)
+        with transaction.atomic():
+            # update() минует сигналы, статистику групп пересчитываем сами
+            groups = set(posts.values_list('group_id', flat=True))
+            posts.update(group=job.group)
+            refresh_group_stats(groups | {job.group_id})
+        progress(job, len(ids))
+
+
+def purge_comments(job, target_ids, chunk_size):
+    comments = Comment.objects.filter(post_id__in=target_ids)
+    job.total = comments.count()
+    job.save(update_fields=['total'])
+    chunked_delete(comments, chunk_size, job)
+
+
+HANDLERS = {
+    ModerationJob.DELETE_AUTHOR_POSTS: delete_author_posts,
+    ModerationJob.MOVE_TO_GROUP: move_to_group,
+    ModerationJob.PURGE_COMMENTS: purge_comments,
+}
+
+
+def claim_job():
+    """Берёт самую старую задачу из очереди или брошенную.
+
+    Задача достаётся тому, чей условный UPDATE сменил статус, поэтому
+    параллельные команды не выполняют одну задачу дважды. Брошенная —
+    RUNNING без пачек дольше MODERATION_JOB_TIMEOUT: её воркер упал,
+    и она выполняется заново (обработчики можно повторять).
+    """
+    stale = timezone.now() - timedelta(
+        seconds=settings.MODERATION_JOB_TIMEOUT
+    )
+    claimable = ModerationJob.objects.filter(
+        Q(status=ModerationJob.PENDING)
+        | Q(status=ModerationJob.RUNNING, heartbeat__lt=stale)
+    )
+    while True:
+        job = claimable.order_by('created').first()
+        if job is None:
+            return None
+        claimed = claimable.filter(pk=job.pk).update(
+            status=ModerationJob.RUNNING,
+            heartbeat=timezone.now(),
+            processed=0,
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def run_job(job, chunk_size):
+    try:
+        HANDLERS[job.action](job, json.loads(job.target_ids), chunk_size)
+    except Exception as error:
+        job.status = ModerationJob.FAILED
+        job.error = str(error)
+    else:
+        job.status = ModerationJob.DONE
+    job.finished = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished'])
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import graph
+from .caches import bump_latest, forget_following, forget_groups, forget_latest
+from .models import Follow, Group, Post
+from .stats import count_new_post, schedule_refresh
+
+
+@receiver(pre_save, sender=Post)
+def post_group_before_save(sender, instance, **kwargs):
+    """Запоминает прежнюю группу редактируемого поста."""
+    instance.previous_group_id = None
+    if instance.pk is not None:
+        instance.previous_group_id = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created:
+        bump_latest(instance)
+        if instance.group_id is not None:
+            count_new_post(instance)
+    elif instance.previous_group_id != instance.group_id:
+        schedule_refresh(instance.previous_group_id)
+        schedule_refresh(instance.group_id)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    forget_latest(instance)
+    if instance.group_id is not None:
+        schedule_refresh(instance.group_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    forget_groups()
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    forget_following(instance.user_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if settings.FOLLOW_GRAPH and created:
+        graph.follow_changed(instance.user_id, instance.author_id, True)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    if settings.FOLLOW_GRAPH:
+        graph.follow_changed(instance.user_id, instance.author_id, False)
@@ -0,0 +1,77 @@
+"""Фильтр волн почти одинаковых постов и комментариев.
+
+Текст превращается в MinHash-подпись по символьным 5-граммам
+(one permutation hashing: один хеш на шингл, минимум по корзинам).
+Подпись режется на полосы (LSH); ключ полосы указывает в общем кэше
+на последнюю похожую подпись и число таких текстов за окно
+SPAM_WINDOW. Проверка — один get_many, запоминание — один set_many,
+сколько бы текстов ни было в окне.
+"""
+
+import re
+from hashlib import blake2b
+
+from django.conf import settings
+from django.core.cache import cache
+
+BANDS = 8
+ROWS = 4
+BINS = BANDS * ROWS
+EMPTY = 2 ** 64
+SHINGLE = 5
+
+NOT_WORD = re.compile(r'\W+')
+
+
+def normalize(text):
+    return NOT_WORD.sub(' ', text.lower()).strip()
+
+
+def signature(text):
+    """MinHash-подпись текста или None, если текст слишком короткий."""
+    text = normalize(text)
+    if len(text) < settings.SPAM_MIN_LENGTH:
+        return None
+    bins = [EMPTY] * BINS
+    for start in range(len(text) - SHINGLE + 1):
+        value = int.from_bytes(blake2b(
+            text[start:start + SHINGLE].encode(), digest_size=8
+        ).digest(), 'little')
+        index = value % BINS
+        if value < bins[index]:
+            bins[index] = value
+    return tuple(bins)
+
+
+def similarity(first, second):
+    """Оценка сходства Жаккара по непустым корзинам."""
+    filled = [
+        (a, b) for a, b in zip(first, second) if a != EMPTY or b != EMPTY
+    ]
+    if not filled:
+        return 0
+    return sum(a == b for a, b in filled) / len(filled)
+
+
+def band_keys(sig):
+    return [
+        f'posts:spam:{band}:{hash(sig[band * ROWS:(band + 1) * ROWS])}'
+        for band in range(BANDS)
+    ]
+
+
+def duplicates(sig):
+    """Сколько похожих текстов было за окно."""
+    count = 0
+    for stored, seen in cache.get_many(band_keys(sig)).values():
+        if similarity(stored, sig) >= settings.SPAM_SIMILARITY:
+            count = max(count, seen)
+    return count
+
+
+def remember(sig, seen):
+    """Учитывает сохранённый текст; seen — результат duplicates(sig)."""
+    value = (sig, seen + 1)
+    cache.set_many(
+        dict.fromkeys(band_keys(sig), value), settings.SPAM_WINDOW
+    )
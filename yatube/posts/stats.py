@@ -0,0 +1,59 @@
+from django.db import transaction
+from django.db.models import Count, F, Max, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .caches import forget_group_stats
+from .models import Group, Post
+
+
+def group_stats(posts):
+    return posts.aggregate(
+        posts_count=Count('id'),
+        authors_count=Count('author', distinct=True),
+        last_post_at=Max('created'),
+    )
+
+
+def refresh_group_stats(group_ids):
+    """Пересчитывает статистику групп целиком по их постам."""
+    group_ids = set(group_ids) - {None}
+    for group_id in group_ids:
+        Group.objects.filter(pk=group_id).update(
+            **group_stats(Post.objects.filter(group_id=group_id))
+        )
+    forget_group_stats(group_ids)
+
+
+def count_new_post(post):
+    """Учитывает новый пост в статистике его группы одним UPDATE."""
+    new_author = not Post.objects.filter(
+        group_id=post.group_id, author_id=post.author_id
+    ).exclude(pk=post.pk).exists()
+    created = Value(post.created)
+    Group.objects.filter(pk=post.group_id).update(
+        posts_count=F('posts_count') + 1,
+        authors_count=F('authors_count') + int(new_author),
+        last_post_at=Greatest(Coalesce('last_post_at', created), created),
+    )
+    forget_group_stats([post.group_id])
+
+
+def schedule_refresh(group_id):
+    """Пересчёт группы после коммита.
+
+    Удаление пачки постов даёт один пересчёт группы на транзакцию,
+    а не по пересчёту на каждый пост. После отката транзакции Django
+    забывает её колбэки, и пересчёт не нужен.
+    """
+    connection = transaction.get_connection()
+    for _, callback in connection.run_on_commit:
+        group_ids = getattr(callback, 'group_ids', None)
+        if group_ids is not None:
+            group_ids.add(group_id)
+            return
+
+    def refresh():
+        refresh_group_stats(refresh.group_ids)
+
+    refresh.group_ids = {group_id}
+    transaction.on_commit(refresh)
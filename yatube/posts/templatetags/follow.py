@@ -0,0 +1,55 @@
+import re
+
+from django import template
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+SLOT = '<!--follow-button:{}:{}-->'
+SLOT_RE = re.compile(r'<!--follow-button:(\d+):([\w.@+-]+)-->')
+
+
+@register.simple_tag
+def follow_button_slot(post):
+    """Место кнопки подписки во фрагменте, общем для всех зрителей."""
+    return mark_safe(SLOT.format(post.author_id, post.author.username))
+
+
+@register.tag
+def follow_buttons(parser, token):
+    """{% follow_buttons %}...{% endfollow_buttons %}: подставляет
+    кнопки текущего зрителя в места, оставленные follow_button_slot.
+
+    Тело обычно закэшировано {% cache %} без ключа зрителя, а кнопки
+    рендерятся заново на каждый запрос.
+    """
+    nodelist = parser.parse(('endfollow_buttons',))
+    parser.delete_first_token()
+    return FollowButtonsNode(nodelist)
+
+
+class FollowButtonsNode(template.Node):
+    def __init__(self, nodelist):
+        self.nodelist = nodelist
+
+    def render(self, context):
+        html = self.nodelist.render(context)
+        user = context['user']
+        if not user.is_authenticated:
+            return SLOT_RE.sub('', html)
+        button = context.template.engine.get_template(
+            'includes/follow_button.html'
+        )
+        following_ids = context['following_ids']
+
+        def render_button(match):
+            author_id = int(match[1])
+            if author_id == user.id:
+                return ''
+            return button.render(context.new({
+                'author_id': author_id,
+                'username': match[2],
+                'following_ids': following_ids,
+            }))
+
+        return mark_safe(SLOT_RE.sub(render_button, html))
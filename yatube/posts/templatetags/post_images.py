@@ -0,0 +1,20 @@
+from django import template
+from django.core.files.storage import default_storage
+
+from ..images import srcset
+
+register = template.Library()
+
+
+@register.inclusion_tag('includes/picture.html')
+def post_picture(post, sizes='100vw'):
+    """Адаптивная картинка поста: srcset по ширинам и форматам."""
+    variants = post.variants
+    context = {'post': post, 'variants': variants, 'sizes': sizes}
+    if variants:
+        context.update(
+            webp_srcset=srcset(variants, 'webp'),
+            jpeg_srcset=srcset(variants, 'jpeg'),
+            src=default_storage.url(variants[-1]['jpeg']),
+        )
+    return context
@@ -0,0 +1,130 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.admin import ACTION_CHECKBOX_NAME
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Comment, Follow, Group, ModerationJob, Post
+from ..moderation import claim_job, queue_job
+
+User = get_user_model()
+
+
+class PostAdminTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@test.ru', password='pass'
+        )
+        cls.groups = [
+            Group.objects.create(
+                title=f'Группа {i}', slug=f'group-{i}', description='-'
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.admin_client = Client()
+        self.admin_client.force_login(self.admin)
+
+    def changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.admin_client.get(
+                reverse('admin:posts_post_changelist')
+            )
+        self.assertEqual(response.status_code, 200)
+        return len(queries.captured_queries)
+
+    def create_posts(self, count):
+        for i in range(count):
+            author = User.objects.create(
+                username=f'author{Post.objects.count()}'
+            )
+            Post.objects.create(
+                text=f'Пост {i}', author=author, group=self.groups[i % 3]
+            )
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Число запросов списка постов не зависит от числа строк."""
+        self.create_posts(2)
+        self.changelist_queries()
+        few_rows = self.changelist_queries()
+        self.create_posts(20)
+        cache.clear()
+        self.changelist_queries()
+        self.assertEqual(self.changelist_queries(), few_rows)
+
+    def run_action(self, action, posts, **data):
+        data.update({
+            'action': action,
+            ACTION_CHECKBOX_NAME: [post.pk for post in posts],
+        })
+        self.admin_client.post(reverse('admin:posts_post_changelist'), data)
+
+    def test_delete_author_posts_runs_in_background(self):
+        """Удаление постов автора ставится в очередь и идёт пачками."""
+        spammer = User.objects.create(username='spammer')
+        posts = [
+            Post.objects.create(text=f'Спам {i}', author=spammer)
+            for i in range(5)
+        ]
+        Comment.objects.create(post=posts[0], author=spammer, text='Спам')
+        self.create_posts(1)
+        Follow.objects.create(user=spammer, author=self.admin)
+        Follow.objects.create(user=self.admin, author=spammer)
+        self.run_action('delete_author_posts', posts[:1])
+        self.assertEqual(Post.objects.filter(author=spammer).count(), 5)
+        call_command('run_moderation_jobs', chunk_size=2, stdout=StringIO())
+        job = ModerationJob.objects.get()
+        self.assertEqual(job.status, ModerationJob.DONE)
+        self.assertEqual(job.processed, job.total)
+        self.assertFalse(Post.objects.filter(author=spammer).exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_move_to_group(self):
+        self.create_posts(3)
+        posts = list(Post.objects.all())
+        self.run_action(
+            'move_to_group', posts, group=self.groups[2].pk
+        )
+        call_command('run_moderation_jobs', stdout=StringIO())
+        self.assertEqual(
+            Post.objects.filter(group=self.groups[2]).count(), 3
+        )
+
+    def test_job_is_claimed_once(self):
+        job = queue_job(ModerationJob.PURGE_COMMENTS, [], self.admin)
+        self.assertEqual(claim_job(), job)
+        self.assertEqual(
+            ModerationJob.objects.get().status, ModerationJob.RUNNING
+        )
+        self.assertIsNone(claim_job())
+
+    def test_abandoned_job_is_restarted(self):
+        """Задача упавшего воркера выполняется заново после
+        MODERATION_JOB_TIMEOUT, а живая не трогается."""
+        self.create_posts(2)
+        post = Post.objects.first()
+        Comment.objects.create(post=post, author=self.admin, text='Спам')
+        job = queue_job(ModerationJob.PURGE_COMMENTS, [post.pk], self.admin)
+        ModerationJob.objects.filter(pk=job.pk).update(
+            status=ModerationJob.RUNNING, heartbeat=timezone.now()
+        )
+        call_command('run_moderation_jobs', stdout=StringIO())
+        self.assertTrue(Comment.objects.exists())
+        ModerationJob.objects.filter(pk=job.pk).update(
+            heartbeat=timezone.now() - timedelta(hours=1)
+        )
+        call_command('run_moderation_jobs', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, ModerationJob.DONE)
+        self.assertFalse(Comment.objects.exists())
@@ -0,0 +1,158 @@
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..graph import FollowGraph
+from ..models import (ArchivedComment, ArchivedPost, Comment, Follow, Group,
+                      Post)
+
+User = get_user_model()
+
+
+class ArchivePostsCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='testuser')
+        cls.old_post = Post.objects.create(
+            text='Старый пост',
+            author=cls.author,
+        )
+        Comment.objects.create(
+            post=cls.old_post,
+            author=cls.author,
+            text='Старый комментарий',
+        )
+        cls.new_post = Post.objects.create(
+            text='Новый пост',
+            author=cls.author,
+        )
+        Post.objects.filter(pk=cls.old_post.pk).update(
+            created=timezone.now() - timedelta(
+                days=settings.POSTS_ARCHIVE_AFTER_DAYS + 1
+            )
+        )
+
+    def test_old_posts_move_to_archive(self):
+        """Старые посты с комментариями переезжают в архив."""
+        call_command('archive_posts', batch_size=1, stdout=StringIO())
+        self.assertFalse(Post.objects.filter(pk=self.old_post.pk).exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertTrue(Post.objects.filter(pk=self.new_post.pk).exists())
+        archived = ArchivedPost.objects.get(pk=self.old_post.pk)
+        self.assertEqual(archived.text, self.old_post.text)
+        self.assertEqual(
+            ArchivedComment.objects.get().text, 'Старый комментарий'
+        )
+
+    def test_post_detail_falls_back_to_archive(self):
+        """Страница архивного поста открывается по прежнему адресу."""
+        call_command('archive_posts', stdout=StringIO())
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.old_post.pk})
+        )
+        self.assertTrue(response.context['archived'])
+        self.assertContains(response, 'Старый комментарий')
+
+
+class SeedCommandTest(TestCase):
+    NOW = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+
+    def seed(self, **options):
+        call_command(
+            'seed',
+            users=20,
+            groups=3,
+            posts=100,
+            comments=200,
+            follows=30,
+            batch_size=40,
+            stdout=StringIO(),
+            **options,
+        )
+
+    def snapshot(self):
+        return list(
+            Post.objects.order_by('id').values_list(
+                'author__username', 'group__slug', 'text', 'created'
+            )
+        )
+
+    def test_seed_creates_requested_rows(self):
+        self.seed()
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 100)
+        self.assertEqual(Comment.objects.count(), 200)
+        self.assertEqual(Follow.objects.count(), 30)
+
+    def test_seed_is_deterministic(self):
+        self.seed(seed=7, now=self.NOW)
+        first = self.snapshot()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed(seed=7, now=self.NOW)
+        self.assertEqual(self.snapshot(), first)
+
+
+class FollowGraphSnapshotCommandTest(TestCase):
+    def test_snapshot_loads_back(self):
+        users = [
+            User.objects.create(username=f'user{i}') for i in range(3)
+        ]
+        Follow.objects.create(user=users[0], author=users[2])
+        Follow.objects.create(user=users[1], author=users[2])
+        path = os.path.join(tempfile.mkdtemp(), 'graph.bin')
+        self.addCleanup(os.rmdir, os.path.dirname(path))
+        self.addCleanup(os.remove, path)
+        call_command('follow_graph_snapshot', path=path, stdout=StringIO())
+        graph = FollowGraph.load(path)
+        self.assertEqual(graph.followers_count(users[2].id), 2)
+        self.assertTrue(graph.follows(users[0].id, users[2].id))
+        self.assertEqual(graph.followees_of(users[2].id), [])
+
+
+class CollectMediaGarbageCommandTest(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        storage = override_settings(
+            DEFAULT_FILE_STORAGE='core.storage.ContentAddressedStorage',
+            MEDIA_ROOT=media.name,
+        )
+        storage.enable()
+        self.addCleanup(storage.disable)
+
+    def save(self, name, content, age_hours):
+        name = default_storage.save(name, ContentFile(content))
+        stamp = time.time() - age_hours * 3600
+        os.utime(default_storage.path(name), (stamp, stamp))
+        return name
+
+    def test_removes_only_old_unreferenced_files(self):
+        used = self.save('posts/used.jpg', b'used', 48)
+        variant = self.save('posts/variants/used_320.webp', b'variant', 48)
+        orphan = self.save('posts/orphan.jpg', b'orphan', 48)
+        fresh = self.save('posts/fresh.jpg', b'fresh', 1)
+        Post.objects.create(
+            text='Пост',
+            author=User.objects.create(username='author'),
+            image=used,
+            image_variants=f'[{{"width": 320, "webp": "{variant}"}}]',
+        )
+        call_command('collect_media_garbage', stdout=StringIO())
+        for name, exists in (
+            (used, True), (variant, True), (orphan, False), (fresh, True)
+        ):
+            with self.subTest(name=name):
+                self.assertEqual(default_storage.exists(name), exists)
@@ -1,13 +1,21 @@
+import multiprocessing
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
 
+from core.storage import is_content_addressed
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
+from PIL import Image
 
+from .. import images, spam
 from ..models import Comment, Group, Post
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -18,8 +26,7 @@ User = get_user_model()
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostCreateFormTests(TestCase):
     @classmethod
-    def setUpClass(cls):
-        super().setUpClass()
+    def setUpTestData(cls):
         cls.group = Group.objects.create(
             title='Тестовая группа',
             slug='test-slug',
@@ -82,6 +89,38 @@ class PostCreateFormTests(TestCase):
             ).exists()
         )
 
+    def test_create_post_builds_image_variants(self):
+        """Загруженная картинка нарезается на варианты для srcset."""
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        uploaded = SimpleUploadedFile(
+            name='variants.gif',
+            content=small_gif,
+            content_type='image/gif'
+        )
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': uploaded},
+            follow=True
+        )
+        post = Post.objects.get(text='Пост с картинкой')
+        self.assertEqual(
+            [variant['width'] for variant in post.variants],
+            list(settings.POST_IMAGE_WIDTHS)
+        )
+        for variant in post.variants:
+            for fmt in settings.POST_IMAGE_FORMATS:
+                with self.subTest(width=variant['width'], fmt=fmt):
+                    self.assertTrue(variant[fmt].endswith('.' + fmt))
+        self.assertContains(response, 'srcset=')
+        self.assertContains(response, 'loading="lazy"')
+
     def test_edit_post(self):
         """При отправке валидной формы со страницы редактирования
         поста происходит изменение поста в базе данных.
@@ -159,3 +198,203 @@ class PostCreateFormTests(TestCase):
                 post=self.post.id,
             ).exists()
         )
+
+
+class SpamFilterTests(TestCase):
+    TEXT = (
+        'Только сегодня скидки на курсы python и django, '
+        'пишите в личные сообщения, количество мест ограничено'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='spammer')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_near_duplicates_are_rejected(self):
+        """Волна почти одинаковых постов обрывается на пороге."""
+        for number in range(settings.SPAM_DUPLICATES_LIMIT + 1):
+            response = self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={'text': f'{self.TEXT}! Акция №{number}'},
+            )
+        self.assertEqual(
+            Post.objects.filter(text__startswith=self.TEXT).count(),
+            settings.SPAM_DUPLICATES_LIMIT,
+        )
+        self.assertFormError(
+            response, 'form', 'text',
+            'Очень похожий текст недавно уже публиковали',
+        )
+
+    def test_comment_wave_is_rejected(self):
+        url = reverse('posts:add_comment', args=[self.post.id])
+        for _ in range(settings.SPAM_DUPLICATES_LIMIT + 2):
+            self.authorized_client.post(url, data={'text': self.TEXT})
+        self.assertEqual(
+            Comment.objects.count(), settings.SPAM_DUPLICATES_LIMIT
+        )
+
+    def test_different_and_short_texts_pass(self):
+        texts = [
+            'Спасибо!',
+            'Спасибо!',
+            'Спасибо!',
+            'Спасибо!',
+            self.TEXT,
+            'Сегодня ходили в горы, погода была отличная, все довольны',
+        ]
+        for text in texts:
+            self.authorized_client.post(
+                reverse('posts:post_create'), data={'text': text}
+            )
+        self.assertEqual(Post.objects.count(), len(texts) + 1)
+
+    def test_signature_similarity(self):
+        first = spam.signature(self.TEXT)
+        self.assertGreater(
+            spam.similarity(first, spam.signature(self.TEXT + '!!!')), 0.8
+        )
+        self.assertLess(spam.similarity(first, spam.signature(
+            'Сегодня ходили в горы, погода была отличная, все довольны'
+        )), 0.2)
+        self.assertIsNone(spam.signature('Спасибо!'))
+
+
+def phone_photo(size=(3000, 1000)):
+    """JPEG как с телефона: поворот в EXIF и координаты съёмки."""
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif[0x010F] = 'Phone'
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(
+        buffer, 'JPEG', quality=95, exif=exif
+    )
+    return SimpleUploadedFile(
+        'photo.jpg', buffer.getvalue(), content_type='image/jpeg'
+    )
+
+
+class ImageProcessingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='photographer')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    @override_settings(POST_IMAGE_MAX_SIZE=(1200, 1200))
+    def test_original_is_normalized(self):
+        """Оригинал повёрнут по EXIF, без метаданных и не больше
+        POST_IMAGE_MAX_SIZE."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Фото', 'image': phone_photo()},
+        )
+        post = Post.objects.get(text='Фото')
+        with default_storage.open(post.image.name) as file:
+            image = Image.open(file)
+            self.assertEqual(image.size, (400, 1200))
+            self.assertEqual(len(image.getexif()), 0)
+        self.assertEqual(len(post.variants), len(settings.POST_IMAGE_WIDTHS))
+
+    def test_gif_original_is_kept(self):
+        gif = BytesIO()
+        Image.new('P', (4, 4)).save(gif, 'GIF')
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Гифка', 'image': SimpleUploadedFile(
+                'anim.gif', gif.getvalue(), content_type='image/gif'
+            )},
+        )
+        post = Post.objects.get(text='Гифка')
+        self.assertEqual(
+            default_storage.open(post.image.name).read(), gif.getvalue()
+        )
+
+
+@override_settings(IMAGE_PROCESSING='pool', IMAGE_PROCESSING_WORKERS=1)
+class ImagePoolTests(TransactionTestCase):
+    def setUp(self):
+        if multiprocessing.current_process().daemon:
+            self.skipTest('в демоническом процессе пула не бывает')
+
+    def tearDown(self):
+        if images.executor is not None:
+            images.executor.shutdown()
+            images.executor = None
+
+    def test_image_is_processed_after_commit(self):
+        post = Post.objects.create(
+            text='Фото',
+            author=User.objects.create(username='photographer'),
+            image=phone_photo(),
+        )
+        images.executor.shutdown()
+        post.refresh_from_db()
+        self.assertEqual(len(post.variants), len(settings.POST_IMAGE_WIDTHS))
+        with default_storage.open(post.image.name) as file:
+            width, height = Image.open(file).size
+        self.assertEqual(height, max(settings.POST_IMAGE_MAX_SIZE))
+        self.assertLess(width, height)
+
+
+class ContentAddressedUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='reposter')
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        storage = override_settings(
+            DEFAULT_FILE_STORAGE='core.storage.ContentAddressedStorage',
+            MEDIA_ROOT=media.name,
+        )
+        storage.enable()
+        self.addCleanup(storage.disable)
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_reuploaded_picture_is_stored_once(self):
+        photo = phone_photo()
+        for text in ('Первый раз', 'Второй раз'):
+            photo.seek(0)
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={'text': text, 'image': photo},
+            )
+        first, second = Post.objects.order_by('id')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.variants, second.variants)
+        self.assertRegex(
+            first.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$'
+        )
+        self.assertTrue(is_content_addressed(first.image.name))
+        for variant in first.variants:
+            for fmt in settings.POST_IMAGE_FORMATS:
+                self.assertRegex(
+                    variant[fmt],
+                    r'^posts/variants/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$',
+                )
+
+
+class ImageDaemonFallbackTests(TestCase):
+    @override_settings(IMAGE_PROCESSING='pool')
+    def test_daemon_process_handles_image_inline(self):
+        process = multiprocessing.current_process()
+        self.addCleanup(setattr, process, 'daemon', process.daemon)
+        process.daemon = True
+        post = Post.objects.create(
+            text='Фото',
+            author=User.objects.create(username='photographer'),
+            image=phone_photo(),
+        )
+        self.assertIsNone(images.executor)
+        self.assertEqual(len(post.variants), len(settings.POST_IMAGE_WIDTHS))
@@ -1,16 +1,25 @@
+import os
+import tempfile
+from unittest import mock
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-from ..models import Group, Post
+from .. import graph
+from ..caches import get_cached_group
+from ..models import Follow, FollowEvent, Group, Post
 
 User = get_user_model()
 
 
 class PostModelTest(TestCase):
     @classmethod
-    def setUpClass(cls):
-        super().setUpClass()
+    def setUpTestData(cls):
         cls.user = User.objects.create_user(username='auth')
         cls.group = Group.objects.create(
             title='Тестовая группа',
@@ -54,3 +63,202 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_value)
+
+
+class GroupStatsTest(TransactionTestCase):
+    """Статистика группы поддерживается при создании, переносе
+    и удалении постов (пересчёт идёт после коммита)."""
+
+    def setUp(self):
+        cache.clear()
+        self.authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(2)
+        ]
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        self.other = Group.objects.create(
+            title='Другая', slug='other', description='Описание'
+        )
+
+    def stats(self, group):
+        group.refresh_from_db()
+        return group.posts_count, group.authors_count, group.last_post_at
+
+    def test_created_posts_are_counted(self):
+        posts = [
+            Post.objects.create(
+                text='Пост', author=author, group=self.group
+            )
+            for author in self.authors + self.authors[:1]
+        ]
+        self.assertEqual(self.stats(self.group), (3, 2, posts[-1].created))
+
+    def test_moved_and_deleted_posts_are_recounted(self):
+        post = Post.objects.create(
+            text='Пост', author=self.authors[0], group=self.group
+        )
+        post.group = self.other
+        post.save()
+        self.assertEqual(self.stats(self.group), (0, 0, None))
+        self.assertEqual(self.stats(self.other), (1, 1, post.created))
+        post.delete()
+        self.assertEqual(self.stats(self.other), (0, 0, None))
+
+    def test_cached_group_follows_admin_changes(self):
+        self.assertEqual(get_cached_group('group'), self.group)
+        with self.assertNumQueries(0):
+            get_cached_group('group')
+        self.group.slug = 'renamed'
+        self.group.save()
+        self.assertIsNone(get_cached_group('group'))
+        self.assertEqual(get_cached_group('renamed').title, 'Группа')
+
+    def test_stale_local_copy_is_dropped_after_cache_reset(self):
+        get_cached_group('group')
+        Group.objects.filter(pk=self.group.pk).update(title='Другая')
+        cache.clear()
+        self.assertEqual(get_cached_group('group').title, 'Другая')
+
+    def test_group_page_sees_every_new_post(self):
+        """Счётчик постов группы берётся из отдельного ключа общего
+        кэша, который сбрасывает каждый новый пост, поэтому новый пост
+        не вытесняет старый за пределы страницы."""
+        url = reverse('posts:group_list', args=[self.group.slug])
+        for number in range(3):
+            Post.objects.create(
+                text=f'Пост {number}', author=self.authors[0],
+                group=self.group,
+            )
+        self.client.get(url)
+        Post.objects.create(
+            text='Пост 3', author=self.authors[1], group=self.group
+        )
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        page = response.context['page_obj']
+        self.assertEqual(page.paginator.count, 4)
+        self.assertEqual(len(page.object_list), 4)
+        self.assertEqual(response.context['group'].posts_count, 4)
+        self.assertFalse(any(
+            'posts_group' in query['sql'] and 'JOIN' not in query['sql']
+            for query in queries.captured_queries
+        ))
+
+
+@override_settings(FOLLOW_GRAPH=True)
+class FollowGraphTest(TransactionTestCase):
+    """Граф подписок совпадает с таблицей Follow после подписок,
+    отписок и загрузки из снимка."""
+
+    def setUp(self):
+        cache.clear()
+        graph.graph = None
+        self.addCleanup(setattr, graph, 'graph', None)
+        self.users = [
+            User.objects.create_user(username=f'user{i}') for i in range(5)
+        ]
+        self.ids = [user.id for user in self.users]
+        for user, author in ((0, 1), (0, 2), (1, 3), (2, 3), (2, 4)):
+            Follow.objects.create(
+                user=self.users[user], author=self.users[author]
+            )
+
+    def assertMatchesTable(self, follow_graph):
+        for user in self.ids:
+            with self.subTest(user=user):
+                self.assertEqual(
+                    follow_graph.followees_of(user),
+                    sorted(Follow.objects.filter(user_id=user).values_list(
+                        'author_id', flat=True
+                    )),
+                )
+                self.assertEqual(
+                    follow_graph.followers_count(user),
+                    Follow.objects.filter(author_id=user).count(),
+                )
+
+    def test_graph_answers_without_queries(self):
+        follow_graph = graph.follow_graph()
+        first, second, _, third, fourth = self.ids
+        with self.assertNumQueries(0):
+            self.assertTrue(follow_graph.follows(first, second))
+            self.assertFalse(follow_graph.follows(second, first))
+            self.assertEqual(follow_graph.followers_count(third), 2)
+            # Подписки подписок: 3 читают двое, 4 — один
+            self.assertEqual(
+                follow_graph.suggestions(first, 5), [third, fourth]
+            )
+        self.assertMatchesTable(follow_graph)
+
+    def test_signals_update_loaded_graph(self):
+        follow_graph = graph.follow_graph()
+        Follow.objects.create(user=self.users[4], author=self.users[0])
+        Follow.objects.filter(user=self.users[0]).delete()
+        self.assertIs(graph.follow_graph(), follow_graph)
+        self.assertMatchesTable(follow_graph)
+
+    def remote(self, change):
+        """Выполняет change как другой процесс: событие попадает в
+        журнал и сдвигает версию, а граф этого процесса не трогается."""
+        local, graph.graph = graph.graph, None
+        try:
+            change()
+        finally:
+            graph.graph = local
+
+    def test_remote_changes_are_replayed_from_log(self):
+        """Чужие подписки и отписки граф доигрывает по журналу, не
+        перестраиваясь и не читая таблицу Follow."""
+        follow_graph = graph.follow_graph()
+        self.remote(lambda: Follow.objects.create(
+            user=self.users[3], author=self.users[1]
+        ))
+        self.remote(
+            lambda: Follow.objects.filter(user=self.users[0]).delete()
+        )
+        with mock.patch.object(
+            graph.FollowGraph, 'from_db', side_effect=AssertionError
+        ), CaptureQueriesContext(connection) as queries:
+            self.assertIs(graph.follow_graph(), follow_graph)
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertIn('posts_followevent', queries.captured_queries[0]['sql'])
+        self.assertMatchesTable(follow_graph)
+        with self.assertNumQueries(0):
+            graph.follow_graph()
+
+    @override_settings(FOLLOW_GRAPH_SYNC_INTERVAL=0)
+    def test_log_is_replayed_without_shared_version(self):
+        """Без общего кэша версия не доходит до процесса, и журнал
+        доигрывается по таймеру."""
+        follow_graph = graph.follow_graph()
+        Follow.objects.bulk_create([
+            Follow(user=self.users[3], author=self.users[1]),
+        ])
+        FollowEvent.objects.create(
+            user_id=self.ids[3], author_id=self.ids[1], followed=True
+        )
+        self.assertMatchesTable(graph.follow_graph())
+        self.assertIs(graph.follow_graph(), follow_graph)
+
+    @override_settings(FOLLOW_GRAPH_DELTA_LIMIT=1)
+    def test_deltas_are_compacted(self):
+        follow_graph = graph.follow_graph()
+        Follow.objects.create(user=self.users[3], author=self.users[4])
+        Follow.objects.create(user=self.users[4], author=self.users[3])
+        Follow.objects.filter(user=self.users[2]).delete()
+        self.assertLessEqual(
+            len(follow_graph.added) + len(follow_graph.removed), 1
+        )
+        self.assertMatchesTable(follow_graph)
+
+    def test_snapshot_catches_up_with_table(self):
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        graph.FollowGraph.from_db().save(path)
+        Follow.objects.create(user=self.users[3], author=self.users[0])
+        self.assertMatchesTable(graph.FollowGraph.load(path).sync())
+        Follow.objects.filter(user=self.users[2]).delete()
+        self.assertMatchesTable(graph.FollowGraph.load(path).sync())
@@ -11,8 +11,7 @@ User = get_user_model()
 
 class PostURLTests(TestCase):
     @classmethod
-    def setUpClass(cls):
-        super().setUpClass()
+    def setUpTestData(cls):
         cls.group = Group.objects.create(
             title='Тестовая группа',
             slug='test-slug',
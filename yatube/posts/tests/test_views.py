@@ -1,19 +1,38 @@
+import shutil
+import tempfile
+
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Follow, Group, Post
+from core.memory import measure
+
+from .. import graph
+from ..models import Comment, Follow, Group, Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 User = get_user_model()
 
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
 
 class PostURLTests(TestCase):
     @classmethod
-    def setUpClass(cls):
-        super().setUpClass()
+    def setUpTestData(cls):
         cls.group = Group.objects.create(
             title='Тестовая группа',
             slug='test-slug',
@@ -240,11 +259,66 @@ class PostURLTests(TestCase):
         )
         self.assertNotIn(new_post, response.context['page_obj'])
 
+    def test_new_posts_marker(self):
+        """Эндпоинт новых постов отвечает по курсору."""
+        url = reverse('posts:new_posts')
+        response = self.client.get(url, {'since': self.post.id})
+        self.assertEqual(
+            response.json(), {'latest': self.post.id, 'has_new': False}
+        )
+        new_post = Post.objects.create(
+            text='Тестовый пост2',
+            author=User.objects.create(username='testuser2'),
+        )
+        response = self.client.get(url, {'since': self.post.id})
+        self.assertEqual(
+            response.json(), {'latest': new_post.id, 'has_new': True}
+        )
+        response = self.client.get(url, {'since': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_new_posts_marker_drops_deleted_post(self):
+        """Удалённый последний пост больше не считается новым."""
+        url = reverse('posts:new_posts')
+        author = User.objects.create(username='testuser2')
+        Follow.objects.create(user=self.user, author=author)
+        previous = Post.objects.create(text='Прежний пост', author=author)
+        newest = Post.objects.create(text='Новый пост', author=author)
+        for params in ({}, {'feed': 'follow'}):
+            self.authorized_client.get(url, {**params, 'since': 0})
+        newest.delete()
+        for params in ({}, {'feed': 'follow'}):
+            with self.subTest(**params):
+                response = self.authorized_client.get(
+                    url, {**params, 'since': previous.id}
+                )
+                self.assertEqual(
+                    response.json(),
+                    {'latest': previous.id, 'has_new': False},
+                )
+
+    def test_new_posts_marker_in_follow_feed(self):
+        """Лента подписок учитывает только посты избранных авторов."""
+        url = reverse('posts:new_posts')
+        author = User.objects.create(username='testuser2')
+        Follow.objects.create(user=self.user, author=author)
+        Post.objects.create(text='Чужой пост', author=self.new_user)
+        response = self.authorized_client.get(
+            url, {'feed': 'follow', 'since': 0}
+        )
+        self.assertFalse(response.json()['has_new'])
+        new_post = Post.objects.create(text='Тестовый пост2', author=author)
+        response = self.authorized_client.get(
+            url, {'feed': 'follow', 'since': 0}
+        )
+        self.assertEqual(
+            response.json(), {'latest': new_post.id, 'has_new': True}
+        )
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
-    def setUpClass(cls):
-        super().setUpClass()
+    def setUpTestData(cls):
         author = User.objects.create(username='testuser')
         cls.group = Group.objects.create(
             title='Тестовая группа',
@@ -311,3 +385,196 @@ class PaginatorViewsTest(TestCase):
             len(response.context['page_obj']),
             Post.objects.count() - settings.POSTS_ON_PAGE
         )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostImageQueriesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='testuser')
+        for i in range(3):
+            Post.objects.create(
+                text='Пост с картинкой ' + str(i),
+                author=cls.author,
+                image=SimpleUploadedFile(
+                    name=f'small{i}.gif',
+                    content=SMALL_GIF,
+                    content_type='image/gif'
+                ),
+            )
+        cls.legacy_post = Post.objects.create(
+            text='Старый пост',
+            author=cls.author,
+            image=SimpleUploadedFile(
+                name='legacy.gif',
+                content=SMALL_GIF,
+                content_type='image/gif'
+            ),
+        )
+        Post.objects.filter(pk=cls.legacy_post.pk).update(image_variants='')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_feed_images_do_not_query_kvstore(self):
+        """Картинки ленты не добавляют запросов к thumbnail_kvstore."""
+        url = reverse(
+            'posts:profile', kwargs={'username': self.author.username}
+        )
+        self.client.get(url)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertContains(response, 'srcset=')
+        kvstore_queries = [
+            query['sql'] for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(kvstore_queries, [])
+
+
+class MemoryCeilingTest(TestCase):
+    """Память на запрос не растёт вместе с числом комментариев
+    и номером страницы ленты."""
+
+    COMMENTS = 10000
+    POSTS = 3000
+    # Потолки с запасом примерно вдвое от измеренного пика
+    POST_DETAIL_CEILING = 512 * 1024
+    DEEP_INDEX_CEILING = 256 * 1024
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='testuser')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=author) for i in range(cls.POSTS)
+        )
+        cls.post = Post.objects.first()
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=author, text=f'Комментарий {i}')
+            for i in range(cls.COMMENTS)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def peak(self, url):
+        # Первый запрос импортирует модули и компилирует шаблоны
+        self.client.get(url)
+        cache.clear()
+        response, report = measure(self.client.get, url)
+        self.assertEqual(response.status_code, 200)
+        return report.peak
+
+    def test_post_detail_with_many_comments(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        peak = self.peak(url)
+        self.assertLess(peak, self.POST_DETAIL_CEILING)
+
+    def test_index_deep_page(self):
+        url = reverse('posts:index') + '?page=250'
+        peak = self.peak(url)
+        self.assertLess(peak, self.DEEP_INDEX_CEILING)
+
+
+class FollowButtonsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user(username='viewer')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(5)
+        ]
+        for author in cls.authors:
+            Post.objects.create(text='Пост', author=author)
+        Follow.objects.create(user=cls.viewer, author=cls.authors[0])
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.viewer)
+
+    def test_following_set_is_loaded_once_per_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(reverse('posts:index'))
+        follow_queries = [
+            query['sql'] for query in queries.captured_queries
+            if 'posts_follow' in query['sql']
+        ]
+        self.assertEqual(len(follow_queries), 1)
+        self.assertContains(response, 'Отписаться', count=1)
+        self.assertContains(response, 'Подписаться', count=4)
+
+    def test_follow_updates_cached_index(self):
+        self.authorized_client.get(reverse('posts:index'))
+        self.authorized_client.get(reverse(
+            'posts:profile_follow', args=[self.authors[1].username]
+        ))
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Отписаться', count=2)
+
+    def test_viewers_share_cached_page(self):
+        """Страница кэшируется одна на всех, а кнопки у каждого зрителя
+        свои."""
+        self.authorized_client.get(reverse('posts:index'))
+        author = Client()
+        author.force_login(self.authors[0])
+        Follow.objects.create(user=self.authors[0], author=self.authors[1])
+        with CaptureQueriesContext(connection) as queries:
+            response = author.get(reverse('posts:index'))
+        # Посты страницы читаются только при промахе кэша
+        self.assertFalse(any(
+            'posts_post' in query['sql'] and 'JOIN' in query['sql']
+            for query in queries.captured_queries
+        ))
+        self.assertContains(response, 'Отписаться', count=1)
+        self.assertContains(response, 'Подписаться', count=3)
+        self.assertContains(
+            response,
+            reverse('posts:profile_unfollow', args=[self.authors[1].username]),
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Подписаться')
+
+
+@override_settings(FOLLOW_GRAPH=True)
+class FollowGraphViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user(username='viewer')
+        cls.friend = User.objects.create_user(username='friend')
+        cls.star = User.objects.create_user(username='star')
+        Post.objects.create(text='Пост друга', author=cls.friend)
+        Post.objects.create(text='Пост звезды', author=cls.star)
+        Follow.objects.create(user=cls.viewer, author=cls.friend)
+        Follow.objects.create(user=cls.friend, author=cls.star)
+
+    def setUp(self):
+        cache.clear()
+        graph.graph = None
+        self.addCleanup(setattr, graph, 'graph', None)
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.viewer)
+
+    def test_follow_index_uses_graph(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [post.text for post in response.context['page_obj']],
+            ['Пост друга'],
+        )
+        self.assertEqual(response.context['suggestions'], [self.star])
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(reverse('posts:follow_index'))
+        # Ни таблицу Follow, ни журнал граф со свежей версией не читает
+        self.assertFalse(any(
+            'posts_follow' in query['sql']
+            for query in queries.captured_queries
+        ))
+
+    def test_profile_shows_followers_count(self):
+        response = self.authorized_client.get(
+            reverse('posts:profile', args=[self.star.username])
+        )
+        self.assertEqual(response.context['followers_count'], 1)
+        self.assertContains(response, 'Подписчиков: 1')
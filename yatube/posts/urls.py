@@ -25,6 +25,8 @@ urlpatterns = [
     ),
     #  Страница с постами авторов на которых подписан текущий пользователь
     path('follow/', views.follow_index, name='follow_index'),
+    #  Проверка новых постов в ленте
+    path('posts/new/', views.new_posts, name='new_posts'),
     #  Подписаться на автора
     path(
         'profile/<str:username>/follow/',
@@ -2,14 +2,22 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from users.caches import get_user_by_username
 
+from .caches import (get_cached_group, latest_post_id,
+                     latest_post_id_for_authors, viewer_following_ids)
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post
+from .graph import follow_graph
+from .models import ArchivedPost, Follow, Post
 
 
-def paginate_page(request, queryset):
-    paginator = Paginator(queryset, settings.POSTS_ON_PAGE)
+def paginate_page(request, queryset, per_page=None, count=None):
+    paginator = Paginator(queryset, per_page or settings.POSTS_ON_PAGE)
+    if count is not None:
+        # Известное заранее число объектов избавляет от COUNT(*)
+        paginator.count = count
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
 
@@ -25,42 +33,72 @@ def index(request):
 
 def group_posts(request, slug):
     """Страница c постами, отфильтрованная по группам"""
-    group = get_object_or_404(Group, slug=slug)
+    group = get_cached_group(slug)
+    if group is None:
+        raise Http404
     posts = group.posts.select_related('group', 'author')
     context = {
         'group': group,
-        'page_obj': paginate_page(request, posts),
+        'page_obj': paginate_page(request, posts, count=group.posts_count),
     }
     return render(request, 'posts/group_list.html', context)
 
 
-User = get_user_model()
+def get_author_or_404(request, username):
+    """Автор по имени из URL без запроса к БД в обычном случае.
+
+    Свой профиль (например, редирект после публикации) берётся
+    прямо из request.user.
+    """
+    if request.user.is_authenticated and request.user.username == username:
+        return request.user
+    author = get_user_by_username(username)
+    if author is None:
+        raise Http404
+    return author
 
 
 def profile(request, username):
     """Профиль автора"""
-    author = get_object_or_404(User, username=username)
+    author = get_author_or_404(request, username)
     posts = author.posts_author.select_related('author', 'group')
-    following = (
-        request.user.is_authenticated
-        and author.following.filter(user=request.user).exists()
-    )
     context = {
         'author': author,
         'page_obj': paginate_page(request, posts),
-        'following': following,
+        'following': author.id in viewer_following_ids(request),
     }
+    if settings.FOLLOW_GRAPH:
+        context['followers_count'] = follow_graph().followers_count(
+            author.id
+        )
     return render(request, 'posts/profile.html', context)
 
 
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    """Страница поста. Если пост уже в архиве, показывается оттуда."""
+    archived = False
+    try:
+        post = Post.objects.select_related('author', 'group').get(id=post_id)
+    except Post.DoesNotExist:
+        post = get_object_or_404(
+            ArchivedPost.objects.select_related('author', 'group'),
+            id=post_id,
+        )
+        archived = True
     form = CommentForm(request.POST or None)
-    comments = post.comments.select_related('author')
+    comments = paginate_page(
+        request,
+        post.comments.select_related('author').order_by('id'),
+        settings.COMMENTS_ON_PAGE,
+    )
     context = {
         'post': post,
+        'author_posts_count': Post.objects.filter(
+            author_id=post.author_id
+        ).count(),
         'form': form,
         'comments': comments,
+        'archived': archived,
     }
     return render(request, 'posts/post_detail.html', context)
 
@@ -75,6 +113,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         form.save()
+        form.remember_text()
         return redirect('posts:profile', request.user)
     return render(request, 'posts/create_post.html', {'form': form})
 
@@ -82,7 +121,7 @@ def post_create(request):
 @login_required
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
-    if request.user != post.author:
+    if request.user.id != post.author_id:
         return redirect('posts:post_detail', post.id)
     form = PostForm(
         request.POST or None,
@@ -109,27 +148,45 @@ def add_comment(request, post_id):
         comment.author = request.user
         comment.post = post
         comment.save()
+        form.remember_text()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
     """Страница с постами авторов на которых подписан текущий пользователь."""
-    posts = Post.objects.filter(author__following__user=request.user)
-    context = {'page_obj': paginate_page(request, posts)}
+    posts = Post.objects.select_related('author', 'group')
+    context = {}
+    authors = None
+    if settings.FOLLOW_GRAPH:
+        graph = follow_graph()
+        authors = graph.followees_of(request.user.id)
+        context['suggestions'] = suggested_authors(
+            graph.suggestions(request.user.id, settings.FOLLOW_SUGGESTIONS)
+        )
+    if authors is not None and len(authors) <= settings.FOLLOW_GRAPH_IN_LIMIT:
+        posts = posts.filter(author_id__in=authors)
+    else:
+        posts = posts.filter(author__following__user=request.user)
+    context['page_obj'] = paginate_page(request, posts)
     return render(request, 'posts/follow.html', context)
 
 
+def suggested_authors(ids):
+    """Пользователи по id в порядке рекомендаций графа подписок."""
+    if not ids:
+        return []
+    users = get_user_model().objects.in_bulk(ids)
+    return [users[user_id] for user_id in ids if user_id in users]
+
+
 @login_required
 def profile_follow(request, username):
     """Подписаться на автора."""
-    following = get_object_or_404(User, username=username)
-    already_follows = Follow.objects.filter(
-        user=request.user,
-        author=following,
-    ).exists()
+    following = get_author_or_404(request, username)
+    already_follows = following.id in viewer_following_ids(request)
     if not already_follows and request.user != following:
-        Follow.objects.create(
+        Follow.objects.get_or_create(
             user=request.user,
             author=following,
         )
@@ -139,9 +196,25 @@ def profile_follow(request, username):
 @login_required
 def profile_unfollow(request, username):
     """Отписаться от автора."""
-    following = get_object_or_404(User, username=username)
+    following = get_author_or_404(request, username)
     Follow.objects.filter(
         user=request.user,
         author=following,
     ).delete()
     return redirect('posts:profile', username=username)
+
+
+def new_posts(request):
+    """Есть ли в ленте посты новее курсора ?since=<id>.
+
+    Отвечает по маркерам из кэша, не выполняя запрос ленты.
+    """
+    since = request.GET.get('since', '')
+    if not since.isdigit():
+        return HttpResponseBadRequest()
+    if request.GET.get('feed') == 'follow' and request.user.is_authenticated:
+        authors = viewer_following_ids(request)
+        latest = latest_post_id_for_authors(authors)
+    else:
+        latest = latest_post_id()
+    return JsonResponse({'latest': latest, 'has_new': latest > int(since)})
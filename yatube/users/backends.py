@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, make_password
+
+from .caches import get_cached_user
+from .hashing import hashing_pool
+
+User = get_user_model()
+
+
+class PooledModelBackend(ModelBackend):
+    """ModelBackend, проверяющий пароли в ограниченном пуле
+    hashing_pool."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        pool = hashing_pool()
+        try:
+            user = User._default_manager.get_by_natural_key(username)
+        except User.DoesNotExist:
+            # Хешируем впустую, чтобы время ответа не выдавало,
+            # существует ли такой пользователь.
+            pool.run(make_password, password)
+            return None
+        outdated = []
+        valid = pool.run(
+            check_password, password, user.password, outdated.append
+        )
+        if not valid or not self.user_can_authenticate(user):
+            return None
+        if outdated:
+            user.password = pool.run(make_password, password)
+            user.save(update_fields=['password'])
+        return user
+
+
+class CachedModelBackend(PooledModelBackend):
+    """Пользователь сессии берётся из кэша.
+
+    Кэш должен быть общим для всех воркеров: иначе смена пароля
+    сбросит запись только в одном процессе. Включается в
+    yatube/production_settings.py.
+    """
+
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        if user is not None and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,62 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+User = get_user_model()
+
+USER_KEY = 'users:user:{}'
+# Имя пользователя в URL произвольное, в ключ кэша идёт его хеш
+USERNAME_KEY = 'users:username:{}'
+UNKNOWN = 0
+
+
+def get_cached_user(user_id):
+    """Пользователь по id из кэша; в БД идём только при промахе."""
+    key = USER_KEY.format(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.filter(pk=user_id).first()
+        if user is not None:
+            cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+    return user
+
+
+def forget_user(user_id):
+    cache.delete(USER_KEY.format(user_id))
+
+
+def username_key(username):
+    return USERNAME_KEY.format(md5(username.encode()).hexdigest())
+
+
+def get_user_by_username(username):
+    """Пользователь по имени через кэш имя -> id.
+
+    Неизвестные имена тоже запоминаются (на USERNAME_NEGATIVE_TIMEOUT),
+    чтобы перебор случайных имён не доходил до БД. Возвращает None,
+    если такого пользователя нет.
+    """
+    key = username_key(username)
+    user_id = cache.get(key)
+    if user_id == UNKNOWN:
+        return None
+    if user_id is not None:
+        user = get_cached_user(user_id)
+        # После переименования старое имя ведёт на чужой username
+        if user is not None and user.username == username:
+            return user
+    user = User.objects.filter(username=username).first()
+    if user is None:
+        cache.set(key, UNKNOWN, settings.USERNAME_NEGATIVE_TIMEOUT)
+        return None
+    cache.set_many(
+        {key: user.id, USER_KEY.format(user.id): user},
+        settings.USER_CACHE_TIMEOUT,
+    )
+    return user
+
+
+def forget_username(username):
+    cache.delete(username_key(username))
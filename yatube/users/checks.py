@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def hashing_pool_fits_threads(app_configs, **kwargs):
+    """Запрос ждёт проверку пароля в потоке из ASGI_THREADS, поэтому
+    пул вместе с очередью должен оставлять потоки остальным запросам."""
+    limit = settings.ASGI_THREADS - settings.AUTH_HASH_FREE_THREADS
+    if settings.AUTH_HASH_WORKERS + settings.AUTH_HASH_QUEUE <= limit:
+        return []
+    return [Error(
+        'AUTH_HASH_WORKERS + AUTH_HASH_QUEUE больше, чем '
+        f'ASGI_THREADS - AUTH_HASH_FREE_THREADS = {limit}',
+        hint='Всплеск входов занял бы все потоки запросов: уменьшите '
+             'очередь пула или увеличьте ASGI_THREADS.',
+        id='users.E001',
+    )]
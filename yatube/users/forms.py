@@ -1,5 +1,9 @@
+from django import forms
+from django.contrib.admin.forms import AdminAuthenticationForm
 from django.contrib.auth import get_user_model
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
+
+from .hashing import PoolFull
 
 User = get_user_model()
 
@@ -8,3 +12,26 @@ class CreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = User
         fields = ('first_name', 'last_name', 'username', 'email')
+
+
+class LoginForm(AuthenticationForm):
+    """При переполненном пуле проверки паролей просит повторить вход
+    позже, а не сообщает о неверном пароле."""
+
+    error_messages = {
+        **AuthenticationForm.error_messages,
+        'too_many_logins': 'Слишком много входов, попробуйте позже.',
+    }
+
+    def clean(self):
+        try:
+            return super().clean()
+        except PoolFull:
+            raise forms.ValidationError(
+                self.error_messages['too_many_logins'],
+                code='too_many_logins',
+            )
+
+
+class AdminLoginForm(LoginForm, AdminAuthenticationForm):
+    pass
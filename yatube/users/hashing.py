@@ -0,0 +1,86 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from core import metrics
+from django.conf import settings
+
+
+class PoolFull(Exception):
+    """Пул проверки паролей переполнен.
+
+    Не PermissionDenied: её django.contrib.auth.authenticate глотает,
+    и пользователь увидел бы «неверный пароль» вместо «попробуйте
+    позже».
+    """
+
+
+class HashingPool:
+    """Ограниченный пул потоков для проверки паролей.
+
+    Хеширование (PBKDF2/Argon2) отпускает GIL, поэтому вынос в
+    отдельные потоки не даёт всплеску логинов занять все рабочие
+    потоки. Сверх workers + queue_size одновременных проверок
+    запрос отклоняется сразу, а не ждёт в очереди.
+    """
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix='auth-hash',
+        )
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def run(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            metrics.inc('yatube_auth_hash_rejected_total')
+            raise PoolFull('Слишком много одновременных входов')
+        with self.lock:
+            self.in_flight += 1
+            self.report()
+        try:
+            return self.executor.submit(func, *args).result()
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+                self.completed += 1
+                self.report()
+            self.slots.release()
+
+    def report(self):
+        """Обновляет метрики занятости; вызывается под self.lock."""
+        metrics.gauge('yatube_auth_hash_in_flight', self.in_flight)
+        metrics.gauge(
+            'yatube_auth_hash_queued', max(0, self.in_flight - self.workers)
+        )
+
+    def stats(self):
+        with self.lock:
+            return {
+                'in_flight': self.in_flight,
+                'queued': max(0, self.in_flight - self.workers),
+                'completed': self.completed,
+                'rejected': self.rejected,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def hashing_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool(
+                    settings.AUTH_HASH_WORKERS,
+                    settings.AUTH_HASH_QUEUE,
+                )
+    return _pool
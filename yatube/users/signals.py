@@ -0,0 +1,18 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caches import forget_user, forget_username
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    """Смена пароля и любые правки сбрасывают закэшированного юзера.
+
+    Новое имя могло быть запомнено как неизвестное.
+    """
+    forget_user(instance.pk)
+    forget_username(instance.username)
@@ -0,0 +1,159 @@
+import threading
+from unittest import mock
+
+from core import metrics
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .caches import get_cached_user, get_user_by_username
+from .checks import hashing_pool_fits_threads
+from .forms import LoginForm
+from .hashing import HashingPool, PoolFull, hashing_pool
+
+User = get_user_model()
+
+REJECTED_KEY = ('yatube_auth_hash_rejected_total', ())
+
+
+@override_settings(
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+    AUTHENTICATION_BACKENDS=['users.backends.CachedModelBackend'],
+)
+class SessionQueriesTest(TestCase):
+    """Профиль production_settings: сессия и пользователь из кэша."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_anonymous_feed_has_no_session_queries(self):
+        """Гость не вызывает запросов к сессиям и пользователям."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:index'))
+        for query in queries.captured_queries:
+            with self.subTest(sql=query['sql']):
+                self.assertNotIn('django_session', query['sql'])
+                self.assertNotIn('auth_user', query['sql'])
+
+    def test_authorized_request_uses_cached_session_and_user(self):
+        """Сессия и пользователь повторно берутся из кэша."""
+        url = reverse('about:author')
+        self.authorized_client.get(url)
+        with self.assertNumQueries(0):
+            response = self.authorized_client.get(url)
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_password_change_resets_cached_user(self):
+        old_hash = get_cached_user(self.user.pk).password
+        self.user.set_password('new-password-123')
+        self.user.save()
+        self.assertNotEqual(get_cached_user(self.user.pk).password, old_hash)
+
+
+class UsernameCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_profile_resolves_author_from_cache(self):
+        get_user_by_username('author')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_by_username('author'), self.user)
+
+    def test_unknown_username_is_cached_until_created(self):
+        url = reverse('posts:profile', args=['nobody'])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 404)
+        User.objects.create_user(username='nobody')
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_rename_invalidates_old_username(self):
+        get_user_by_username('author')
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertIsNone(get_user_by_username('author'))
+        self.assertEqual(get_user_by_username('renamed'), self.user)
+
+
+class HashingPoolTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='testuser', password='secret-password-123'
+        )
+
+    def test_login_goes_through_pool(self):
+        completed = hashing_pool().stats()['completed']
+        self.assertTrue(
+            self.client.login(
+                username='testuser', password='secret-password-123'
+            )
+        )
+        self.assertFalse(
+            self.client.login(username='testuser', password='wrong')
+        )
+        self.assertEqual(hashing_pool().stats()['completed'], completed + 2)
+
+    def test_full_pool_rejects_instead_of_waiting(self):
+        """Переполненный пул отклоняет проверку сразу."""
+        pool = HashingPool(workers=1, queue_size=0)
+        started, release = threading.Event(), threading.Event()
+
+        def slow_hash():
+            started.set()
+            release.wait()
+
+        worker = threading.Thread(target=pool.run, args=(slow_hash,))
+        worker.start()
+        started.wait()
+        rejected = metrics.registry.values.get(REJECTED_KEY, 0)
+        with self.assertRaises(PoolFull):
+            pool.run(slow_hash)
+        self.assertEqual(pool.stats()['in_flight'], 1)
+        self.assertEqual(pool.stats()['rejected'], 1)
+        self.assertEqual(
+            metrics.registry.values[('yatube_auth_hash_in_flight', ())], 1
+        )
+        self.assertEqual(metrics.registry.values[REJECTED_KEY], rejected + 1)
+        release.set()
+        worker.join()
+        self.assertEqual(
+            metrics.registry.values[('yatube_auth_hash_in_flight', ())], 0
+        )
+
+    def test_full_pool_asks_to_retry_login_later(self):
+        pool = HashingPool(workers=1, queue_size=0)
+        pool.slots.acquire()
+        credentials = {
+            'username': 'testuser', 'password': 'secret-password-123',
+        }
+        with mock.patch('users.backends.hashing_pool', return_value=pool):
+            for url in (reverse('users:login'), reverse('admin:login')):
+                with self.subTest(url=url):
+                    response = self.client.post(url, credentials)
+                    self.assertEqual(
+                        response.context['form'].non_field_errors(),
+                        [LoginForm.error_messages['too_many_logins']],
+                    )
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_pool_must_leave_threads_for_other_requests(self):
+        self.assertEqual(hashing_pool_fits_threads(None), [])
+        with override_settings(
+            ASGI_THREADS=8, AUTH_HASH_FREE_THREADS=4,
+            AUTH_HASH_WORKERS=2, AUTH_HASH_QUEUE=16,
+        ):
+            errors = hashing_pool_fits_threads(None)
+        self.assertEqual([error.id for error in errors], ['users.E001'])
@@ -8,6 +8,7 @@ from django.contrib.auth.views import (LoginView, LogoutView,
 from django.urls import path
 
 from . import views
+from .forms import LoginForm
 
 app_name = 'users'
 
@@ -20,7 +21,10 @@ urlpatterns = [
     ),
     path(
         'login/',
-        LoginView.as_view(template_name='users/login.html'),
+        LoginView.as_view(
+            template_name='users/login.html',
+            authentication_form=LoginForm,
+        ),
         name='login'
     ),
     path(
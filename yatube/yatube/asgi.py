@@ -0,0 +1,205 @@
+"""
+ASGI config for yatube project.
+
+Django 2.2 не умеет ASGI сам, поэтому здесь тонкий адаптер: тело
+запроса читается и ответ отправляется в цикле событий, а синхронное
+WSGI-приложение (вьюхи и доступ к БД) выполняется в ограниченном пуле
+потоков ASGI_THREADS. Медленные клиенты и загрузки больше не держат
+рабочий поток, пока передают байты.
+
+Тело запроса до FILE_UPLOAD_MAX_MEMORY_SIZE держится в памяти, больше —
+во временном файле; тело длиннее ASGI_MAX_BODY_SIZE отклоняется с 413.
+Потоковые ответы (StreamingHttpResponse, FileResponse) отправляются по
+кускам, не собираясь в памяти.
+
+Запуск: uvicorn yatube.asgi:application
+"""
+
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+wsgi_application = get_wsgi_application()
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASGI_THREADS,
+    thread_name_prefix='asgi-wsgi',
+)
+
+
+class RequestTooLarge(Exception):
+    pass
+
+
+def build_environ(scope, body):
+    """WSGI environ из ASGI scope и уже прочитанного тела (файла)."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'CONTENT_LENGTH':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = 'HTTP_' + name
+            if key in environ:
+                value = environ[key] + ',' + value
+            environ[key] = value
+    return environ
+
+
+def run_wsgi(environ):
+    """Выполняет WSGI-приложение в потоке пула.
+
+    Обычный ответ собирается тут же, потоковый возвращается
+    итератором: его куски читаются по одному в stream().
+    """
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        # Set-Cookie от WSGIHandler начинается с пробела, а строгие
+        # ASGI-серверы (h11) такие значения не пропускают
+        response['headers'] = [
+            (name.lower().encode('latin-1'), value.strip().encode('latin-1'))
+            for name, value in headers
+        ]
+
+    result = wsgi_application(environ, start_response)
+    if getattr(result, 'streaming', False):
+        return response['status'], response['headers'], None, result
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], body, None
+
+
+async def read_body(scope, receive):
+    """Тело запроса во временном файле или None, если клиент ушёл."""
+    limit = settings.ASGI_MAX_BODY_SIZE
+    for name, value in scope.get('headers', []):
+        if (
+            name.lower() == b'content-length'
+            and value.isdigit() and int(value) > limit
+        ):
+            raise RequestTooLarge
+    body = SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    size = 0
+    more_body = True
+    try:
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > limit:
+                raise RequestTooLarge
+            body.write(chunk)
+            more_body = message.get('more_body', False)
+    except BaseException:
+        body.close()
+        raise
+    body.seek(0)
+    return body
+
+
+async def stream(loop, result, send):
+    """Отправляет потоковый ответ по кускам, читая их в пуле потоков."""
+    chunks = iter(result)
+    try:
+        while True:
+            chunk = await loop.run_in_executor(executor, next, chunks, None)
+            if chunk is None:
+                break
+            await send({
+                'type': 'http.response.body',
+                'body': chunk,
+                'more_body': True,
+            })
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(result, 'close'):
+            await loop.run_in_executor(executor, result.close)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        raise ValueError(f'Unsupported ASGI scope: {scope["type"]}')
+    try:
+        body = await read_body(scope, receive)
+    except RequestTooLarge:
+        await send({
+            'type': 'http.response.start',
+            'status': HTTPStatus.REQUEST_ENTITY_TOO_LARGE.value,
+            'headers': [(b'content-type', b'text/plain; charset=utf-8')],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': HTTPStatus.REQUEST_ENTITY_TOO_LARGE.phrase.encode(),
+        })
+        return
+    if body is None:
+        return
+    loop = asyncio.get_running_loop()
+    try:
+        status, headers, content, result = await loop.run_in_executor(
+            executor, run_wsgi, build_environ(scope, body)
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers,
+        })
+        if result is None:
+            await send({'type': 'http.response.body', 'body': content})
+        else:
+            await stream(loop, result, send)
+    finally:
+        body.close()
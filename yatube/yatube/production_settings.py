@@ -0,0 +1,29 @@
+"""
+Настройки боевого развёртывания.
+
+Кэш общий для всех воркеров (memcached), поэтому на нём держатся
+сессии и пользователь сессии: выход и смена пароля сбрасывают
+запись сразу во всех процессах. Остальные кэши проекта (группы,
+подписки, маркеры новых постов, окно спам-фильтра) тоже становятся
+общими.
+
+    DJANGO_SETTINGS_MODULE=yatube.production_settings
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+
+DEBUG = False
+
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.InstrumentedMemcachedCache',
+        'LOCATION': os.environ.get('MEMCACHED_LOCATION', '127.0.0.1:11211'),
+    }
+}
+
+# Сессии читаются из кэша, БД — только при промахе
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
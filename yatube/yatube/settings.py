@@ -44,6 +44,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.SlowQueryLogMiddleware',
+    'core.middleware.MemoryProfileMiddleware',
+    'core.middleware.SamplingProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -72,6 +76,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',  # Добавили
+                'posts.context_processors.following',
             ],
         },
     },
@@ -79,6 +84,12 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Размер пула потоков, в котором ASGI-адаптер выполняет вьюхи
+ASGI_THREADS = 8
+# Предел тела запроса для ASGI-адаптера; до FILE_UPLOAD_MAX_MEMORY_SIZE
+# тело держится в памяти, дальше — во временном файле
+ASGI_MAX_BODY_SIZE = 20 * 1024 * 1024
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -111,22 +122,161 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static/')]
 
+# Сессии и пользователь сессии читаются из БД: кэш здесь свой у
+# каждого процесса, и выход или смена пароля в одном воркере не
+# сбросили бы запись в остальных. Кэширующий вариант с общим
+# memcached — yatube/production_settings.py
+AUTHENTICATION_BACKENDS = ['users.backends.PooledModelBackend']
+USER_CACHE_TIMEOUT = 300
+USERNAME_NEGATIVE_TIMEOUT = 60
+
+# Проверка паролей идёт в отдельном пуле: потоки и длина очереди.
+# Ждущий запрос держит поток ASGI_THREADS; сколько из них всегда
+# остаётся остальным запросам, проверяет users/checks.py
+AUTH_HASH_WORKERS = 2
+AUTH_HASH_QUEUE = 2
+AUTH_HASH_FREE_THREADS = 4
+
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+try:
+    import argon2  # noqa: F401
+except ImportError:
+    pass
+else:
+    # С установленным argon2-cffi новые пароли хешируются Argon2,
+    # старые PBKDF2-хеши обновляются при следующем входе.
+    PASSWORD_HASHERS.insert(0, PASSWORD_HASHERS.pop(2))
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Письма ставятся в очередь, доставляет их send_queued_mail
+EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'
+EMAIL_DELIVERY_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+EMAIL_QUEUE_BATCH_SIZE = 100
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+# Первая повторная попытка через столько секунд, каждая следующая —
+# вдвое позже
+EMAIL_QUEUE_RETRY_DELAY = 60
+# На сколько секунд отправитель берёт пачку писем себе
+EMAIL_QUEUE_LEASE = 600
 
 POSTS_ON_PAGE = 10
+COMMENTS_ON_PAGE = 50
 LETTERS_ON_POST = 15
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Загрузки хранятся под sha256 содержимого (core/storage.py):
+# одинаковые файлы не дублируются, а их адреса можно кэшировать
+# навсегда. Миниатюры sorl-thumbnail уже названы по источнику и
+# параметрам, им хватает обычного хранилища
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+THUMBNAIL_STORAGE = 'django.core.files.storage.FileSystemStorage'
+MEDIA_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.InstrumentedLocMemCache',
     }
 }
+
+# Ширины (px) и форматы уменьшенных копий картинок постов
+POST_IMAGE_WIDTHS = (320, 640, 960)
+POST_IMAGE_FORMATS = ('webp', 'jpeg')
+POST_IMAGE_RATIO = (960, 339)
+POST_IMAGE_QUALITY = 80
+POST_IMAGE_MAX_SIZE = (2048, 2048)
+
+THUMBNAIL_KVSTORE = 'core.thumbnail.LRUKVStore'
+THUMBNAIL_BACKEND = 'core.thumbnail.TimedThumbnailBackend'
+THUMBNAIL_LRU_SIZE = 10000
+
+# Посты старше горизонта переносятся в архив командой archive_posts
+POSTS_ARCHIVE_AFTER_DAYS = 730
+POSTS_ARCHIVE_BATCH_SIZE = 500
+
+# Сколько секунд кэшируется точный COUNT(*) в админке
+ESTIMATED_COUNT_TIMEOUT = 600
+
+# Размер пачки (и транзакции) для фоновых задач модерации
+MODERATION_CHUNK_SIZE = 500
+# Задача, не закончившая пачку за столько секунд, считается брошенной
+MODERATION_JOB_TIMEOUT = 600
+
+# Допустимое число запросов на каждую страницу, проверяется тестами
+QUERY_BUDGET_FILE = os.path.join(BASE_DIR, 'query_budget.json')
+
+# Профилирование памяти каждого запроса через tracemalloc (медленно)
+MEMORY_PROFILE = False
+MEMORY_PROFILE_TOP = 10
+
+# Семплирующий профайлер: доля профилируемых запросов, период снятия
+# стеков в секундах, предел окна /admin/profiler/?seconds=N и общий
+# для воркеров каталог со сроком окна и собранными за него стеками
+SAMPLING_PROFILER = False
+SAMPLING_PROFILER_RATE = 0.01
+SAMPLING_PROFILER_INTERVAL = 0.005
+SAMPLING_PROFILER_MAX_SECONDS = 60
+SAMPLING_PROFILER_DIR = os.path.join(BASE_DIR, 'profiles')
+
+# Метрики /metrics: каталог файлов воркеров и период их записи (с)
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+METRICS_FLUSH_INTERVAL = 5
+
+# Журнал медленных запросов с планами (отчёт: slow_query_report)
+SLOW_QUERY_LOG = os.path.join(BASE_DIR, 'logs', 'slow_queries.jsonl')
+SLOW_QUERY_THRESHOLD_MS = 200
+
+# Время жизни группы и её статистики в общем кэше (с); копия в памяти
+# процесса живёт, пока не сменится версия групп в общем кэше
+GROUP_CACHE_TIMEOUT = 3600
+
+# Сколько секунд кэшируется набор подписок пользователя
+FOLLOWING_CACHE_TIMEOUT = 300
+
+# Время жизни маркеров последнего поста для /posts/new/ (с): с кэшем
+# в памяти процесса другие воркеры увидят новый пост не позже этого
+LATEST_POST_TIMEOUT = 60
+
+# Граф подписок в памяти процесса (posts/graph.py): ленту подписок,
+# число подписчиков и рекомендации авторов считает без SQL-джойнов.
+# Снимок для быстрого старта воркеров пишет follow_graph_snapshot
+FOLLOW_GRAPH = False
+FOLLOW_GRAPH_SNAPSHOT = os.path.join(BASE_DIR, 'follow_graph.bin')
+# Сколько изменений копится в дельтах до перестройки массивов
+FOLLOW_GRAPH_DELTA_LIMIT = 10000
+# Сколько последних событий журнала подписок перечитывается при
+# сверке: транзакции коммитят события не в порядке их id
+FOLLOW_GRAPH_REPLAY = 100
+# Не реже чем раз в столько секунд граф доигрывает журнал, даже если
+# версия в кэше не менялась (кэш в памяти процесса её не передаёт)
+FOLLOW_GRAPH_SYNC_INTERVAL = 60
+# Больше авторов в подписках — лента идёт через JOIN, а не IN (...)
+FOLLOW_GRAPH_IN_LIMIT = 500
+FOLLOW_SUGGESTIONS = 5
+
+# Фильтр волн почти одинаковых текстов (posts/spam.py): новый пост
+# или комментарий отклоняется, если за окно SPAM_WINDOW (с) уже было
+# SPAM_DUPLICATES_LIMIT текстов со сходством не ниже SPAM_SIMILARITY.
+# Короткие тексты («Спасибо!») не проверяются
+SPAM_FILTER = True
+SPAM_WINDOW = 3600
+SPAM_DUPLICATES_LIMIT = 3
+SPAM_SIMILARITY = 0.8
+SPAM_MIN_LENGTH = 40
+
+# Обработка загруженных картинок (posts/images.py): 'pool' — после
+# коммита в пуле процессов, 'sync' — сразу при сохранении поста.
+# Оригинал поворачивается по EXIF, теряет метаданные и ужимается
+# до POST_IMAGE_MAX_SIZE
+IMAGE_PROCESSING = 'pool'
+IMAGE_PROCESSING_WORKERS = 2
@@ -0,0 +1,63 @@
+"""
+Настройки для прогона тестов.
+
+БД в памяти без миграций (схема строится сразу по моделям),
+быстрый MD5-хешер паролей, файлы в памяти и движок sorl-thumbnail,
+который не декодирует и не пересжимает картинки.
+"""
+
+import os
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, CACHES
+
+# Имя воркера при параллельном прогоне тестов (pytest -n / xdist):
+# у каждого воркера свои MEDIA_ROOT, метрики и префикс ключей кэша
+TEST_WORKER = os.environ.get('PYTEST_XDIST_WORKER', '')
+
+
+class DisableMigrations:
+    def __contains__(self, item):
+        return True
+
+    def __getitem__(self, item):
+        return None
+
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+MIGRATION_MODULES = DisableMigrations()
+
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media', TEST_WORKER)
+
+CACHES = {
+    'default': {**CACHES['default'], 'KEY_PREFIX': TEST_WORKER},
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+DEFAULT_FILE_STORAGE = 'core.storage.InMemoryStorage'
+THUMBNAIL_STORAGE = DEFAULT_FILE_STORAGE
+# THUMBNAIL_DUMMY подменяет только отсутствующие исходники, поэтому
+# существующие картинки «рендерит» движок-пустышка
+THUMBNAIL_DUMMY = True
+THUMBNAIL_ENGINE = 'core.thumbnail.DummyEngine'
+
+METRICS_DIR = os.path.join(
+    tempfile.gettempdir(), 'yatube-metrics', TEST_WORKER
+)
+SAMPLING_PROFILER_DIR = os.path.join(
+    tempfile.gettempdir(), 'yatube-profiles', TEST_WORKER
+)
+
+SLOW_QUERY_LOG = None
+
+FOLLOW_GRAPH_SNAPSHOT = None
+
+IMAGE_PROCESSING = 'sync'